@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
 PROJECT_DIR_NAME = 'yatube'
@@ -37,3 +39,22 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_settings():
+    """Временные MEDIA_ROOT и кэш вместо файлов сайта."""
+    from core.testing import isolated_settings
+
+    with isolated_settings():
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """База откатывается после каждого теста, а поколения кэша без
+    фиксации транзакции не меняются: кэш тоже чистится между тестами."""
+    from django.core.cache import cache
+
+    cache.clear()
+    yield
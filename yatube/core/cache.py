@@ -0,0 +1,311 @@
+"""Двухуровневый кэш: LRU в памяти процесса перед общим кэшем.
+
+L2 - любой кэш Django из CACHES, общий для всех воркеров (по умолчанию
+файловый). L1 - LRU в памяти процесса, ограниченный по байтам:
+горячие карточки постов и адреса миниатюр не читаются с диска и не
+распаковываются из общего кэша на каждом запросе.
+
+L1 каждого воркера не знает о записях других, поэтому в него
+попадают только ключи с префиксами из L1_PREFIXES, содержимое которых
+под одним ключом не меняется: в ключ карточки входят поколения поста
+и группы. Ключи, которые перезаписываются под тем же именем, - страницы
+(fetch() обновляет у них мягкий срок), числа объектов после TTL,
+счётчики поколений - читаются только из L2. Запись в L1 живёт не
+дольше L1_TIMEOUT, а clear() в любом воркере меняет эпоху в L2, и
+остальные воркеры сбрасывают свой L1 при следующей сверке эпохи.
+
+Мягкий срок карточки в L1 может отстать от L2 на L1_TIMEOUT: тогда
+воркер перед сроком ещё раз посчитает ту же карточку, но HTML под этим
+ключом прежний.
+
+От лавины пересчётов защищает не кэш, а posts.caching.fetch(): его
+блокировка через add() общая для всех воркеров.
+"""
+import os
+import pickle
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+
+from . import metrics
+
+EPOCH_KEY = 'tiered:epoch'
+
+REQUESTS = metrics.Counter(
+    'yatube_cache_tier_requests_total',
+    'Чтения двухуровневого кэша по уровню и результату.',
+    ('tier', 'result'))
+
+_missing = object()
+
+
+class LocalLRU:
+    """LRU из упакованных значений, ограниченный суммарным размером."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+        self.size = 0
+        self.epoch = None
+        self.checked = 0.0
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            pickled, expires = item
+            if expires <= time.monotonic():
+                self._discard(key)
+                return None
+            self.data.move_to_end(key)
+            return pickled
+
+    def set(self, key, pickled, timeout):
+        if len(pickled) > self.max_bytes:
+            return
+        with self.lock:
+            self._discard(key)
+            self.data[key] = (pickled, time.monotonic() + timeout)
+            self.size += len(pickled)
+            while self.size > self.max_bytes:
+                _, (old, _) = self.data.popitem(last=False)
+                self.size -= len(old)
+
+    def discard(self, key):
+        with self.lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        item = self.data.pop(key, None)
+        if item is not None:
+            self.size -= len(item[0])
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.size = 0
+
+
+# Общие для всех потоков процесса: Django создаёт экземпляр бэкенда
+# на каждый поток.
+_headrooms = {}
+_local_stores = {}
+_stats = {}
+_globals_lock = threading.Lock()
+
+
+class FileCache(FileBasedCache):
+    """FileBasedCache с атомарными add и incr и без подсчёта файлов
+    каталога на каждой записи.
+
+    В Django add и incr читают и пишут файл ключа без блокировки: add может
+    удаться сразу нескольким воркерам, а incr - потерять увеличение и
+    сбросить срок жизни ключа. Здесь они выполняются под flock одного
+    из 16 файлов-замков, выбранного по первой цифре имени файла ключа.
+    MAX_ENTRIES соблюдается приблизительно, см. _cull().
+    """
+
+    # Запас записей без подсчёта файлов - не больше MAX_ENTRIES
+    # / HEADROOM_DIVISOR.
+    HEADROOM_DIVISOR = 10
+
+    def _cull(self):
+        # Django перечисляет весь каталог перед каждой записью. Запись
+        # добавляет не больше файла, поэтому, пока не исчерпан запас до
+        # MAX_ENTRIES с прошлого подсчёта, считать файлы снова незачем.
+        # Запас общий для потоков процесса, а воркеры о чужих записях
+        # не знают, поэтому он ограничен долей MAX_ENTRIES: каталог
+        # вырастает не больше чем на эту долю на каждый воркер.
+        with _globals_lock:
+            if _headrooms.get(self._dir, 0) > 0:
+                _headrooms[self._dir] -= 1
+                return
+        entries = len(self._list_cache_files())
+        if entries >= self._max_entries:
+            super()._cull()
+            entries -= entries // (self._cull_frequency or 1)
+        with _globals_lock:
+            _headrooms[self._dir] = min(
+                self._max_entries - entries - 1,
+                self._max_entries // self.HEADROOM_DIVISOR)
+
+    @contextmanager
+    def _key_lock(self, fname):
+        self._createdir()
+        stripe = os.path.basename(fname)[0]
+        with open(os.path.join(self._dir, f'{stripe}.lock'), 'ab') as f:
+            locks.lock(f, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(f)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._key_lock(self._key_to_file(key, version)):
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        fname = self._key_to_file(key, version)
+        with self._key_lock(fname):
+            try:
+                with open(fname, 'rb') as f:
+                    expiry = pickle.load(f)
+                    value = pickle.loads(zlib.decompress(f.read()))
+            except (FileNotFoundError, EOFError):
+                expiry, value = 0, None
+            if value is None or (expiry is not None and expiry < time.time()):
+                raise ValueError(f"Key '{key}' not found")
+            value += delta
+            timeout = None if expiry is None else expiry - time.time()
+            self.set(key, value, timeout, version)
+
+        return value
+
+
+class TieredCache(BaseCache):
+    """Кэш с L1 в памяти процесса и общим L2.
+
+    OPTIONS: SHARED - псевдоним общего кэша в CACHES, L1_MAX_BYTES,
+    L1_TIMEOUT (секунд), L1_PREFIXES, EPOCH_CHECK_INTERVAL (секунд).
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.l1_timeout = options.get('L1_TIMEOUT', 60)
+        self.l1_prefixes = tuple(options.get('L1_PREFIXES', ()))
+        self.epoch_interval = options.get('EPOCH_CHECK_INTERVAL', 1)
+        with _globals_lock:
+            self.local = _local_stores.setdefault(
+                name, LocalLRU(options.get('L1_MAX_BYTES', 32 * 2 ** 20)))
+            self.stats_counter = _stats.setdefault(name, Counter())
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _count(self, tier, result, amount=1):
+        self.stats_counter[f'{tier}_{result}'] += amount
+        REQUESTS.inc(amount, tier=tier, result=result)
+
+    def stats(self):
+        """Попадания и промахи L1 и L2 и размер L1."""
+        return dict(self.stats_counter, l1_bytes=self.local.size,
+                    l1_keys=len(self.local.data))
+
+    def _local_key(self, key, version):
+        if not key.startswith(self.l1_prefixes):
+            return None
+        return self.make_key(key, version=version)
+
+    def _check_epoch(self):
+        """Сбрасывает L1, если какой-то воркер очистил общий кэш."""
+        now = time.monotonic()
+        if now - self.local.checked < self.epoch_interval:
+            return
+        self.local.checked = now
+        epoch = self.shared.get(EPOCH_KEY)
+        if epoch != self.local.epoch:
+            self.local.clear()
+            self.local.epoch = epoch
+
+    def _l1_timeout(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return self.l1_timeout
+        return min(self.l1_timeout, max(timeout - time.time(), 0))
+
+    def _get_raw(self, key, version):
+        """Значение из L1 или L2; _missing, если его нет."""
+        local_key = self._local_key(key, version)
+        if local_key is not None:
+            self._check_epoch()
+            pickled = self.local.get(local_key)
+            if pickled is not None:
+                self._count('l1', 'hit')
+                return pickle.loads(pickled)
+            self._count('l1', 'miss')
+        value = self.shared.get(key, _missing, version=version)
+        self._count('l2', 'miss' if value is _missing else 'hit')
+        if value is not _missing and local_key is not None:
+            self.local.set(
+                local_key, pickle.dumps(value, self.pickle_protocol),
+                self.l1_timeout)
+
+        return value
+
+    def _set_raw(self, key, value, timeout, version):
+        self.shared.set(key, value, timeout, version=version)
+        local_key = self._local_key(key, version)
+        if local_key is not None:
+            self.local.set(
+                local_key, pickle.dumps(value, self.pickle_protocol),
+                self._l1_timeout(timeout))
+
+    def get(self, key, default=None, version=None):
+        value = self._get_raw(key, version)
+        return default if value is _missing else value
+
+    def get_many(self, keys, version=None):
+        """Ключи L1 читаются по одному, остальные - одним запросом к L2."""
+        found, shared_keys = {}, []
+        for key in keys:
+            if self._local_key(key, version) is None:
+                shared_keys.append(key)
+                continue
+            value = self.get(key, _missing, version=version)
+            if value is not _missing:
+                found[key] = value
+        if shared_keys:
+            values = self.shared.get_many(shared_keys, version=version)
+            self._count('l2', 'hit', len(values))
+            self._count('l2', 'miss', len(shared_keys) - len(values))
+            found.update(values)
+
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._set_raw(key, value, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.add(key, value, timeout, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        local_key = self._local_key(key, version)
+        if local_key is not None:
+            self.local.discard(local_key)
+        self.shared.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        return self._get_raw(key, version) is not _missing
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self._local_key(key, version)
+        if local_key is not None:
+            self.local.discard(local_key)
+        return self.shared.incr(key, delta, version=version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+        epoch = time.time_ns()
+        self.shared.set(EPOCH_KEY, epoch, None)
+        self.local.epoch = epoch
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
@@ -0,0 +1,51 @@
+"""Настройка соединений с базой: PRAGMA и режим транзакций SQLite,
+проверка живости постоянных соединений (см. yatube/db_config.py)."""
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def _begin(connection, mode):
+    connection.cursor().execute(f'BEGIN {mode}')
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Выполняет PRAGMAS из настроек базы на новом соединении SQLite
+    и начинает транзакции atomic в режиме TRANSACTION_MODE.
+
+    В режиме IMMEDIATE транзакция сразу берёт блокировку записи и при
+    занятой базе ждёт busy_timeout. Обычный BEGIN берёт её только на
+    первой записи, и если другой писатель успел раньше, SQLite сразу
+    отвечает «database is locked», не дожидаясь таймаута.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    settings_dict = connection.settings_dict
+    with connection.cursor() as cursor:
+        for name, value in settings_dict.get('PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    mode = settings_dict.get('TRANSACTION_MODE')
+    if not mode:
+        return
+    # Закрытый хук бэкенда SQLite в Django 2.2: им atomic начинает
+    # транзакцию. В Django 5.1 его заменяет OPTIONS['transaction_mode'];
+    # если хука нет, BEGIN IMMEDIATE не должен пропасть молча.
+    if not hasattr(connection, '_start_transaction_under_autocommit'):
+        raise ImproperlyConfigured(
+            'TRANSACTION_MODE не поддерживается этой версией Django.')
+    connection._start_transaction_under_autocommit = (
+        lambda: _begin(connection, mode))
+
+
+@receiver(request_started)
+def check_connections(sender, **kwargs):
+    """Закрывает постоянные соединения, которые перестали отвечать,
+    чтобы запрос открыл новое, а не упал на первом же SQL."""
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict.get('HEALTH_CHECKS')
+                and not connection.is_usable()):
+            connection.close()
@@ -0,0 +1,196 @@
+"""Метрики в текстовом формате Prometheus без внешних зависимостей.
+
+Счётчики и гистограммы живут в памяти процесса; ``/metrics`` отдаёт
+их сотрудникам и запросам с адресов METRICS_ALLOWED_IPS (по умолчанию
+пусто: за обратным прокси адрес клиента не виден, см. settings.py).
+При нескольких воркерах каждый отдаёт свои значения, суммирование
+по инстансам - на стороне Prometheus.
+
+MetricsMiddleware считает длительность и число SQL-запросов каждого
+запроса по имени view; остальные метрики объявляются рядом с кодом,
+который их меняет.
+"""
+import abc
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.db import connections
+
+from .profiling import view_name
+
+"""Границы корзин гистограмм длительности, секунд."""
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace(
+            '"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs)
+
+    return '{' + body + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(abc.ABC):
+    """Метрика с метками; значения хранятся по кортежу значений меток."""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f'{self.name}: ожидаются метки {self.labelnames}')
+        return tuple(labels[name] for name in self.labelnames)
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+    @abc.abstractmethod
+    def samples(self):
+        """Строки (имя, метки, значение)."""
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type}',
+        ]
+        lines.extend(
+            f'{name}{labels} {_format_value(value)}'
+            for name, labels, value in self.samples())
+
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {
+                    'buckets': [0] * len(self.buckets), 'sum': 0.0,
+                    'count': 0}
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state['buckets'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def get_count(self, **labels):
+        state = self.values.get(self._key(labels))
+        return state['count'] if state else 0
+
+    def samples(self):
+        with self.lock:
+            items = sorted(
+                (key, dict(state, buckets=list(state['buckets'])))
+                for key, state in self.values.items())
+        for key, state in items:
+            total = 0
+            for bound, count in zip(self.buckets, state['buckets']):
+                total += count
+                yield (f'{self.name}_bucket', _format_labels(
+                    self.labelnames, key, [('le', _format_value(bound))]),
+                    total)
+            yield (f'{self.name}_bucket', _format_labels(
+                self.labelnames, key, [('le', '+Inf')]), state['count'])
+            yield (f'{self.name}_sum', _format_labels(self.labelnames, key),
+                   state['sum'])
+            yield (f'{self.name}_count', _format_labels(
+                self.labelnames, key), state['count'])
+
+
+def render():
+    """Все метрики процесса в текстовом формате Prometheus."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_SECONDS = Histogram(
+    'yatube_request_duration_seconds', 'Длительность запроса по view.',
+    ('view', 'method'))
+REQUEST_QUERIES = Counter(
+    'yatube_request_db_queries_total', 'SQL-запросы обработки запроса.',
+    ('view',))
+REQUESTS = Counter(
+    'yatube_requests_total', 'Запросы по view и статусу ответа.',
+    ('view', 'status'))
+
+
+class MetricsMiddleware:
+    """Длительность, статус и число SQL-запросов каждого запроса."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            response = self.get_response(request)
+        name = view_name(request)
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - start, view=name, method=request.method)
+        REQUEST_QUERIES.inc(queries, view=name)
+        REQUESTS.inc(view=name, status=response.status_code)
+
+        return response
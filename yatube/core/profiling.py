@@ -0,0 +1,273 @@
+"""Профилирование запросов: куда уходит время каждого view.
+
+ProfilingMiddleware замеряет выборку запросов (доля
+PROFILING_SAMPLE_RATE): полное время, число и время SQL-запросов, время
+рендеринга шаблонов, попадания и промахи кэша. Замеры копятся в памяти
+процесса по имени view (``posts:index``, ``posts:profile``, …), раз в
+PROFILING_LOG_INTERVAL секунд сводка пишется в лог, а сотрудникам она
+видна на странице ``/profiling/``.
+
+Шаблоны и кэш замеряются обёртками, которые ставятся один раз при
+создании middleware, только если PROFILING_SAMPLE_RATE больше нуля, и
+без текущего замера ничего не делают. uninstall() снимает их (тесты).
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+"""Сколько последних длительностей запросов view хранить для перцентилей."""
+HISTORY_SIZE = 1000
+
+_current = ContextVar('profile', default=None)
+
+# Поставленные обёртки: (класс, имя, прежний атрибут класса или None).
+_installed = []
+_install_lock = threading.Lock()
+
+
+class RequestProfile:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Вложенные шаблоны и вызовы кэша внутри вызовов кэша
+        # не считаются второй раз.
+        self.template_depth = 0
+        self.cache_depth = 0
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.sql_count += 1
+
+
+class ViewStats:
+    """Накопленные замеры одного view."""
+
+    def __init__(self):
+        self.requests = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.history = deque(maxlen=HISTORY_SIZE)
+
+    def add(self, wall_time, profile):
+        self.requests += 1
+        self.total_time += wall_time
+        self.max_time = max(self.max_time, wall_time)
+        self.sql_count += profile.sql_count
+        self.sql_time += profile.sql_time
+        self.template_time += profile.template_time
+        self.cache_hits += profile.cache_hits
+        self.cache_misses += profile.cache_misses
+        self.history.append(wall_time)
+
+    def percentile(self, pct):
+        times = sorted(self.history)
+        if not times:
+            return 0.0
+        return times[min(int(pct / 100 * len(times)), len(times) - 1)]
+
+    def summary(self):
+        """Средние на запрос, мс; доля попаданий кэша."""
+        n = self.requests or 1
+        lookups = self.cache_hits + self.cache_misses
+
+        return {
+            'requests': self.requests,
+            'mean_ms': round(self.total_time / n * 1000, 2),
+            'p95_ms': round(self.percentile(95) * 1000, 2),
+            'max_ms': round(self.max_time * 1000, 2),
+            'sql_queries': round(self.sql_count / n, 2),
+            'sql_ms': round(self.sql_time / n * 1000, 2),
+            'template_ms': round(self.template_time / n * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_hit_ratio': (
+                round(self.cache_hits / lookups, 3) if lookups else None),
+        }
+
+
+class Registry:
+    """Замеры процесса по имени view."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+        self.last_dump = time.monotonic()
+
+    def add(self, view_name, wall_time, profile):
+        with self.lock:
+            stats = self.views.get(view_name)
+            if stats is None:
+                stats = self.views[view_name] = ViewStats()
+            stats.add(wall_time, profile)
+
+    def report(self):
+        """[(view, сводка)], самые затратные по общему времени первыми."""
+        with self.lock:
+            items = sorted(
+                self.views.items(),
+                key=lambda item: item[1].total_time, reverse=True)
+            return [(name, stats.summary()) for name, stats in items]
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+    def dump_due(self, interval):
+        """Пора ли писать сводку в лог; отмечает запись."""
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_dump < interval:
+                return False
+            self.last_dump = now
+            return True
+
+
+registry = Registry()
+
+
+def _profiled_render(render):
+    @wraps(render)
+    def wrapper(self, context):
+        profile = _current.get()
+        if profile is None or profile.template_depth:
+            return render(self, context)
+        profile.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile.template_time += time.perf_counter() - start
+            profile.template_depth -= 1
+
+    wrapper.profiled = True
+    return wrapper
+
+
+def _profiled_cache_call(method, count):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        profile = _current.get()
+        if profile is None or profile.cache_depth:
+            return method(self, *args, **kwargs)
+        profile.cache_depth += 1
+        try:
+            result = method(self, *args, **kwargs)
+        finally:
+            profile.cache_depth -= 1
+        hits, misses = count(result, *args, **kwargs)
+        profile.cache_hits += hits
+        profile.cache_misses += misses
+
+        return result
+
+    wrapper.profiled = True
+    return wrapper
+
+
+def _count_get(result, key, default=None, *args, **kwargs):
+    return (0, 1) if result is default else (1, 0)
+
+
+def _count_get_many(result, keys, **kwargs):
+    return len(result), len(keys) - len(result)
+
+
+def _wrap(owner, name, wrap):
+    method = getattr(owner, name)
+    if getattr(method, 'profiled', False):
+        return
+    _installed.append((owner, name, owner.__dict__.get(name)))
+    setattr(owner, name, wrap(method))
+
+
+def install():
+    """Ставит обёртки рендеринга шаблонов и чтения кэша."""
+    with _install_lock:
+        _wrap(Template, 'render', _profiled_render)
+        for alias in settings.CACHES:
+            backend = type(caches[alias])
+            _wrap(backend, 'get',
+                  lambda method: _profiled_cache_call(method, _count_get))
+            _wrap(backend, 'get_many', lambda method: _profiled_cache_call(
+                method, _count_get_many))
+
+
+def uninstall():
+    """Снимает обёртки install() и возвращает прежние методы."""
+    with _install_lock:
+        while _installed:
+            owner, name, original = _installed.pop()
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unresolved'
+
+
+class ProfilingMiddleware:
+    """Замеряет долю PROFILING_SAMPLE_RATE запросов; 0 отключает."""
+
+    def __init__(self, get_response):
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        if not self.sample_rate:
+            raise MiddlewareNotUsed
+        self.log_interval = getattr(settings, 'PROFILING_LOG_INTERVAL', 60)
+        self.get_response = get_response
+        install()
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(profile.sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        registry.add(view_name(request), time.perf_counter() - start, profile)
+        if registry.dump_due(self.log_interval):
+            log_report()
+
+        return response
+
+
+def log_report():
+    for name, summary in registry.report():
+        logger.info('%s %s', name, ' '.join(
+            f'{key}={value}' for key, value in summary.items()))
@@ -0,0 +1,159 @@
+"""Чтение из реплик базы данных.
+
+Реплики перечислены в DATABASE_REPLICAS. ReplicaRouter отправляет
+в реплику только чтения внутри view, помеченных ``@read_from_replica``
+(списки и страницы постов); всё остальное, включая любые записи, идёт
+в основную базу ``default``. Пользователи, сессии и права (PRIMARY_APPS)
+всегда читаются из основной базы: их читает middleware на каждом
+запросе, а в тело страницы они не попадают.
+
+Реплика отстаёт от основной базы, поэтому после записи пользователь
+ещё REPLICA_STICKY_SECONDS секунд читает из основной: об этом помнит
+кука, которую ставит ReplicaStickinessMiddleware. Запись посреди
+помеченного view тоже переключает его дальнейшие чтения на основную.
+
+То, что попадает в общий кэш, считается внутри primary_reads() по
+основной базе: иначе запрос сразу после чужой записи увидел бы новые
+поколения кэша, но старые данные реплики, и закэшировал бы устаревшую
+страницу под новым поколением. По той же причине ответ, прочитанный
+из реплики (read_replica()), не получает ETag и Last-Modified.
+
+Поэтому HTML-страницы index, group_posts и profile собираются по
+основной базе, а из реплик данные читают post_detail и follow_index
+и списки, пост и комментарии в API.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = 'primary_until'
+
+# Приложения, модели которых никогда не читаются из реплик.
+PRIMARY_APPS = ('auth', 'sessions', 'contenttypes', 'admin')
+
+
+class RequestState:
+    def __init__(self):
+        self.replica_allowed = False
+        self.wrote = False
+        self.read_replica = False
+
+
+_state = ContextVar('replica_state', default=None)
+
+
+def sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+
+
+def choose_replica():
+    """Реплика для чтения или None, если реплик нет."""
+    replicas = getattr(settings, 'DATABASE_REPLICAS', ())
+    return random.choice(replicas) if replicas else None
+
+
+def is_pinned(request):
+    """Писал ли пользователь недавно: тогда читаем из основной базы."""
+    try:
+        until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+    except ValueError:
+        return False
+    return until > time.time()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica_allowed or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        replica = choose_replica()
+        if replica is None:
+            return DEFAULT_DB_ALIAS
+        state.read_replica = True
+        return replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # В репликах те же данные, что и в основной базе.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Реплики получают схему вместе с данными основной базы.
+        return db not in getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def read_from_replica(view):
+    """Разрешает view читать из реплики, если пользователь не писал
+    последние REPLICA_STICKY_SECONDS секунд."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = _state.get()
+        if state is None:
+            return view(request, *args, **kwargs)
+        allowed = state.replica_allowed
+        state.replica_allowed = (
+            request.method in ('GET', 'HEAD') and not is_pinned(request))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.replica_allowed = allowed
+
+    return wrapper
+
+
+def read_replica():
+    """Читал ли текущий запрос из реплики."""
+    state = _state.get()
+    return state is not None and state.read_replica
+
+
+@contextmanager
+def primary_reads():
+    """Чтения внутри блока идут в основную базу, даже в помеченном view."""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    allowed = state.replica_allowed
+    state.replica_allowed = False
+    try:
+        yield
+    finally:
+        state.replica_allowed = allowed
+
+
+class ReplicaStickinessMiddleware:
+    """Отмечает запросы с записью в базу кукой STICKY_COOKIE."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RequestState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            seconds = sticky_seconds()
+            response.set_cookie(
+                STICKY_COOKIE, str(time.time() + seconds), max_age=seconds,
+                httponly=True, samesite='Lax')
+
+        return response
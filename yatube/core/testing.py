@@ -0,0 +1,75 @@
+"""Настройки, с которыми идут тесты.
+
+Тесты не должны трогать файлы работающего сайта, поэтому картинки
+пишутся во временный MEDIA_ROOT, а общий файловый кэш лежит во
+временном каталоге - состояние кэша не переходит из прогона в прогон.
+Миниатюры готовятся сразу (THUMBNAILS_SYNC): потоки пула не могут
+делить с тестом базу SQLite в памяти. Настройки включает TestRunner
+(manage.py test) и фикстура в tests/conftest.py (pytest).
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def isolated_caches(location):
+    """CACHES, в которых общий файловый кэш лежит в каталоге location."""
+    caches = {
+        alias: dict(config) for alias, config in settings.CACHES.items()}
+    caches['shared']['LOCATION'] = location
+
+    return caches
+
+
+@contextmanager
+def isolated_settings():
+    directory = tempfile.mkdtemp(prefix='yatube-test-')
+    try:
+        with override_settings(
+                MEDIA_ROOT=os.path.join(directory, 'media'),
+                CACHES=isolated_caches(os.path.join(directory, 'cache')),
+                THUMBNAILS_SYNC=True):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@contextmanager
+def capture_on_commit_callbacks(using=DEFAULT_DB_ALIAS, execute=False):
+    """Колбэки transaction.on_commit, зарегистрированные в блоке.
+
+    TestCase не фиксирует транзакцию, и колбэки в нём не выполняются.
+    execute=True выполняет их на выходе из блока, как фиксация.
+    Перенос TestCase.captureOnCommitCallbacks() из Django 3.2.
+    """
+    callbacks = []
+    start = len(connections[using].run_on_commit)
+    try:
+        yield callbacks
+    finally:
+        while True:
+            registered = connections[using].run_on_commit[start:]
+            if not registered:
+                break
+            start += len(registered)
+            for _, callback in registered:
+                callbacks.append(callback)
+                if execute:
+                    callback()
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._test_settings = isolated_settings()
+        self._test_settings.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_settings.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
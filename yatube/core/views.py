@@ -1,4 +1,9 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, HttpResponseForbidden
+from django.shortcuts import redirect, render
+
+from . import metrics, profiling
 
 
 def page_not_found(request, exception):
@@ -11,3 +16,28 @@ def csrf_failure(request, reason=''):
 
 def server_fail(request):
     return render(request, 'core/500.html', status=500)
+
+
+@staff_member_required
+def profiling_report(request):
+    """Сводка профилирования запросов по view; POST её сбрасывает."""
+    if request.method == 'POST':
+        profiling.registry.reset()
+        return redirect('profiling')
+
+    return render(request, 'core/profiling.html', {
+        'report': profiling.registry.report(),
+        'sample_rate': getattr(settings, 'PROFILING_SAMPLE_RATE', 0),
+    })
+
+
+def metrics_view(request):
+    """Метрики для Prometheus: сотрудникам и с адресов
+    METRICS_ALLOWED_IPS."""
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', ())
+    if not (request.user.is_staff
+            or request.META.get('REMOTE_ADDR') in allowed_ips):
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+        metrics.render(), content_type='text/plain; version=0.0.4')
@@ -0,0 +1,278 @@
+"""JSON API: /api/v1/.
+
+Строки читаются через ``.values()`` - только запрошенные поля, без
+создания моделей. Страница списка не больше API_MAX_LIMIT строк и
+отдаётся обычным JsonResponse; выгрузка без ограничений - в export.
+
+Списки листаются курсором по ключу (дата, id): ``?cursor=`` из поля
+``next`` предыдущего ответа, ``?limit=`` - размер страницы (не больше
+API_MAX_LIMIT). ``?fields=id,text`` оставляет в объектах только
+перечисленные поля.
+
+Изменяет данные только POST /api/v1/follows/ - массовые подписки.
+"""
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_text
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from core.replicas import read_from_replica
+
+from . import follows, timeline
+from .caching import condition_by_generation
+from .constants import API_MAX_LIMIT, COMMENTS_NUM, NUM_PAGE
+from .models import Comment, Group, Post, User
+
+"""Поля объектов API: имя -> поле для values()."""
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+
+
+class ApiError(Exception):
+    """Неверные параметры запроса: ответ 400 с текстом ошибки."""
+
+
+def error(message, status):
+    return JsonResponse(
+        {'error': message}, status=status,
+        json_dumps_params={'ensure_ascii': False})
+
+
+def api_view(view=None, *, methods=('GET', 'HEAD')):
+    """View API для методов methods: ошибки отдаются в JSON, а не
+    страницами сайта."""
+    if view is None:
+        return lambda view: api_view(view, methods=methods)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in methods:
+            return error('Метод не поддерживается.', 405)
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as exception:
+            return error(str(exception), 400)
+        except Http404:
+            return error('Не найдено.', 404)
+
+    return wrapper
+
+
+def selected_fields(request, fields):
+    """Поля из ``?fields=`` (по умолчанию все) в порядке fields."""
+    names = request.GET.get('fields')
+    if not names:
+        return dict(fields)
+    names = set(names.split(','))
+    unknown = names - set(fields)
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(sorted(unknown))}.')
+
+    return {name: field for name, field in fields.items() if name in names}
+
+
+def page_limit(request, default):
+    try:
+        limit = int(request.GET.get('limit', default))
+    except ValueError:
+        raise ApiError('limit должен быть числом.')
+    if not 1 <= limit <= API_MAX_LIMIT:
+        raise ApiError(f'limit должен быть от 1 до {API_MAX_LIMIT}.')
+
+    return limit
+
+
+def encode_cursor(key, pk):
+    return urlsafe_base64_encode(force_bytes(f'{key.isoformat()}|{pk}'))
+
+
+def decode_cursor(cursor):
+    try:
+        key, pk = force_text(urlsafe_base64_decode(cursor)).split('|')
+        key, pk = parse_datetime(key), int(pk)
+    except ValueError:
+        key = None
+    if key is None:
+        raise ApiError('Неверный курсор.')
+
+    return key, pk
+
+
+def keyset_rows(request, queryset, fields, key_field, default_limit):
+    """Строки страницы списка и курсор следующей страницы.
+
+    Строки выбираются одним индексным запросом по (key_field, id)
+    в обратном порядке; для курсора ключ и id читаются всегда.
+    """
+    limit = page_limit(request, default_limit)
+    queryset = queryset.order_by(f'-{key_field}', '-id')
+    cursor = request.GET.get('cursor')
+    if cursor:
+        key, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f'{key_field}__lt': key})
+            | Q(**{key_field: key, 'pk__lt': pk}))
+    lookups = set(fields.values()) | {key_field, 'id'}
+    rows = list(queryset.values(*lookups)[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+
+    return rows, encode_cursor(rows[-1][key_field], rows[-1]['id'])
+
+
+def serialize(row, fields):
+    """Объект API из строки values(): имена полей API, адрес картинки."""
+    item = {name: row[field] for name, field in fields.items()}
+    if 'image' in item:
+        item['image'] = (
+            settings.MEDIA_URL + item['image'] if item['image'] else None)
+
+    return item
+
+
+def list_response(rows, fields, next_cursor):
+    """Ответ ``{"results": [...], "next": курсор}``."""
+    return JsonResponse({
+        'results': [serialize(row, fields) for row in rows],
+        'next': next_cursor,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+def post_list(request, posts, exists=None):
+    """Страница постов; exists() проверяет объект, чьи это посты,
+    только если страница пуста, чтобы ответить 404."""
+    fields = selected_fields(request, POST_FIELDS)
+    rows, next_cursor = keyset_rows(
+        request, posts, fields, 'pub_date', NUM_PAGE)
+    if not rows and exists is not None and not exists():
+        raise Http404
+
+    return list_response(rows, fields, next_cursor)
+
+
+@api_view
+@read_from_replica
+@condition_by_generation('index')
+def index(request):
+    return post_list(request, Post.objects.all())
+
+
+@api_view
+@read_from_replica
+@condition_by_generation('group_page:{slug}')
+def group_posts(request, slug):
+    return post_list(
+        request, Post.objects.filter(group__slug=slug),
+        Group.objects.filter(slug=slug).exists)
+
+
+@api_view
+@read_from_replica
+@condition_by_generation('profile_page:{username}', 'groups')
+def profile_posts(request, username):
+    return post_list(
+        request, Post.objects.filter(author__username=username),
+        User.objects.filter(username=username).exists)
+
+
+@api_view
+@read_from_replica
+def post_detail(request, post_id):
+    fields = selected_fields(request, POST_FIELDS)
+    row = Post.objects.filter(pk=post_id).values(
+        *set(fields.values())).first()
+    if row is None:
+        raise Http404
+
+    return JsonResponse(
+        serialize(row, fields), json_dumps_params={'ensure_ascii': False})
+
+
+@api_view
+@read_from_replica
+def post_comments(request, post_id):
+    fields = selected_fields(request, COMMENT_FIELDS)
+    rows, next_cursor = keyset_rows(
+        request, Comment.objects.filter(post_id=post_id), fields,
+        'created', COMMENTS_NUM)
+    if not rows and not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+
+    return list_response(rows, fields, next_cursor)
+
+
+@api_view
+@read_from_replica
+def follow_feed(request):
+    if not request.user.is_authenticated:
+        return error('Нужно войти.', 401)
+
+    return post_list(request, timeline.feed(request.user))
+
+
+def _usernames(data, field):
+    names = data.get(field, [])
+    if not isinstance(names, list) or not all(
+            isinstance(name, str) for name in names):
+        raise ApiError(f'{field} должен быть списком имён.')
+
+    return set(names)
+
+
+@api_view(methods=('POST',))
+@transaction.atomic
+def bulk_follow(request):
+    """Подписки и отписки списками:
+    ``{"follow": [имена], "unfollow": [имена]}``.
+
+    Авторы ищутся одним запросом, подписки сравниваются с базой как
+    множества и пишутся пачкой. В ответе - на кого подписка оформлена
+    и с кого снята на самом деле, и имена, которых нет.
+    """
+    if not request.user.is_authenticated:
+        return error('Нужно войти.', 401)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        raise ApiError('Тело запроса должно быть JSON.')
+    if not isinstance(data, dict):
+        raise ApiError('Тело запроса должно быть объектом JSON.')
+    follow, unfollow = _usernames(data, 'follow'), _usernames(data, 'unfollow')
+    if follow & unfollow:
+        raise ApiError('Одно имя и в follow, и в unfollow.')
+    if len(follow) + len(unfollow) > API_MAX_LIMIT:
+        raise ApiError(f'Не больше {API_MAX_LIMIT} имён за запрос.')
+    ids = dict(User.objects.filter(
+        username__in=follow | unfollow).values_list('username', 'id'))
+    names = {user_id: username for username, user_id in ids.items()}
+    user_id = request.user.pk
+    added = follows.add(
+        (user_id, ids[name]) for name in follow if name in ids)
+    removed = follows.remove(
+        (user_id, ids[name]) for name in unfollow if name in ids)
+
+    return JsonResponse({
+        'followed': sorted(names[author_id] for _, author_id in added),
+        'unfollowed': sorted(names[author_id] for _, author_id in removed),
+        'unknown': sorted((follow | unfollow) - set(ids)),
+    }, json_dumps_params={'ensure_ascii': False})
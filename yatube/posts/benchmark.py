@@ -0,0 +1,232 @@
+"""Прогон страниц yatube через тестовый клиент Django с замером
+латентности, пропускной способности и числа SQL-запросов."""
+import math
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Group, Post, User
+
+
+class Targets:
+    """Случайные объекты базы, на которые идут запросы сценариев."""
+
+    def __init__(self, rnd):
+        self.rnd = rnd
+        self.group_slugs = list(Group.objects.values_list('slug', flat=True))
+        self.usernames = list(User.objects.filter(
+            posts__isnull=False).distinct().values_list(
+                'username', flat=True))
+        self.post_ids = list(Post.objects.values_list('id', flat=True))
+        self.words = sorted({
+            word for text in Post.objects.values_list(
+                'text', flat=True)[:100]
+            for word in text.split() if len(word) > 3
+        })
+
+    def choice(self, values):
+        return self.rnd.choice(values)
+
+
+"""Сценарии: имя -> функция, возвращающая (метод, url, данные)."""
+SCENARIOS = {
+    'index': lambda targets: ('get', reverse('posts:home'), None),
+    'group_posts': lambda targets: ('get', reverse(
+        'posts:group', args=(targets.choice(targets.group_slugs),)), None),
+    'profile': lambda targets: ('get', reverse(
+        'posts:profile', args=(targets.choice(targets.usernames),)), None),
+    'post_detail': lambda targets: ('get', reverse(
+        'posts:post_detail', args=(targets.choice(targets.post_ids),)), None),
+    'follow_index': lambda targets: (
+        'get', reverse('posts:follow_index'), None),
+    'search': lambda targets: ('get', reverse('posts:search'),
+                               {'q': targets.choice(targets.words)}),
+    'post_create': lambda targets: (
+        'post', reverse('posts:post_create'), {'text': 'Пост бенчмарка'}),
+    'api_index': lambda targets: ('get', reverse('api_v1:index'), None),
+    'api_profile': lambda targets: ('get', reverse(
+        'api_v1:profile_posts', args=(targets.choice(targets.usernames),)),
+        None),
+    'api_post_detail': lambda targets: ('get', reverse(
+        'api_v1:post_detail', args=(targets.choice(targets.post_ids),)),
+        None),
+    'add_comment': lambda targets: ('post', reverse(
+        'posts:add_comment', args=(targets.choice(targets.post_ids),)),
+        {'text': 'Комментарий бенчмарка'}),
+}
+
+
+def percentile(values, pct):
+    """Перцентиль по ближайшему рангу для отсортированного списка."""
+    if not values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def _measure(client, build, targets, requests, cold=False):
+    """Длительности (мс), число запросов к базе и статусы ответов.
+
+    Исключение из view (например, «database is locked») считается
+    статусом error.
+    """
+    timings, queries, statuses = [], [], Counter()
+    for _ in range(requests):
+        method, url, data = build(targets)
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            try:
+                status = getattr(client, method)(url, data or {}).status_code
+            except Exception:
+                status = 'error'
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(captured))
+        statuses[status] += 1
+
+    return timings, queries, statuses
+
+
+def _summary(requests, timings, queries, statuses, total):
+    timings.sort()
+
+    return {
+        'requests': requests,
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'rps': round(requests / total, 1) if total else None,
+        'queries_mean': round(sum(queries) / len(queries), 2),
+        'queries_max': max(queries),
+        'statuses': {str(code): n for code, n in statuses.items()},
+    }
+
+
+def run_scenario(client, build, targets, requests, cold=False):
+    """Выполняет requests запросов сценария и сводит метрики."""
+    timings, queries, statuses = _measure(
+        client, build, targets, requests, cold)
+
+    return _summary(
+        requests, timings, queries, statuses, sum(timings) / 1000)
+
+
+def run_concurrent(make_client, build, targets, requests, concurrency):
+    """Запросы сценария из concurrency потоков одновременно.
+
+    У каждого потока свой клиент и своё соединение с базой; RPS
+    считается по общему времени прогона.
+    """
+    def worker(share):
+        try:
+            return _measure(make_client(), build, targets, share)
+        finally:
+            connections.close_all()
+
+    shares = [requests // concurrency + (i < requests % concurrency)
+              for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(worker, shares))
+    total = time.perf_counter() - start
+    timings, queries, statuses = [], [], Counter()
+    for part_timings, part_queries, part_statuses in results:
+        timings += part_timings
+        queries += part_queries
+        statuses += part_statuses
+    result = _summary(requests, timings, queries, statuses, total)
+    result['concurrency'] = concurrency
+
+    return result
+
+
+def run_burst(make_client, build, targets, bursts, concurrency):
+    """Всплески: concurrency потоков одновременно запрашивают одну
+    и ту же страницу сразу после очистки кэша.
+
+    queries_per_burst показывает, сколько SQL-запросов вызвал всплеск
+    целиком: без защиты от лавины пересчётов страницу строит каждый
+    поток, с защитой - один.
+    """
+    clients = [make_client() for _ in range(concurrency)]
+    timings, queries, statuses = [], [], Counter()
+    total = 0.0
+    for _ in range(bursts):
+        method, url, data = build(targets)
+        cache.clear()
+        barrier = threading.Barrier(concurrency)
+
+        def worker(client):
+            try:
+                barrier.wait()
+                return _measure(client, lambda targets: (method, url, data),
+                                targets, 1)
+            finally:
+                connections.close_all()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(worker, clients))
+        total += time.perf_counter() - start
+        for part_timings, part_queries, part_statuses in results:
+            timings += part_timings
+            queries += part_queries
+            statuses += part_statuses
+    result = _summary(bursts * concurrency, timings, queries, statuses, total)
+    result['concurrency'] = concurrency
+    result['queries_per_burst'] = round(sum(queries) / bursts, 2)
+
+    return result
+
+
+def run(client, names, requests, rnd, cold=False, concurrency=1,
+        make_client=None, burst=False):
+    """Прогоняет сценарии names, возвращает {сценарий: метрики}.
+
+    При concurrency > 1 запросы идут из нескольких потоков, каждый
+    со своим клиентом от make_client(). С burst каждый из requests
+    прогонов - всплеск из concurrency одновременных запросов.
+    """
+    targets = Targets(rnd)
+    if burst:
+        return {
+            name: run_burst(
+                make_client, SCENARIOS[name], targets, requests, concurrency)
+            for name in names
+        }
+    if concurrency > 1:
+        return {
+            name: run_concurrent(
+                make_client, SCENARIOS[name], targets, requests, concurrency)
+            for name in names
+        }
+
+    return {
+        name: run_scenario(client, SCENARIOS[name], targets, requests, cold)
+        for name in names
+    }
+
+
+def compare(previous, current, metrics=('p50_ms', 'p95_ms', 'rps')):
+    """Строки (сценарий, метрика, было, стало, изменение в %)."""
+    rows = []
+    for name, result in current.items():
+        before = previous.get(name)
+        if before is None:
+            continue
+        for metric in metrics:
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            rows.append((name, metric, old, new,
+                         round((new - old) / old * 100, 1)))
+
+    return rows
@@ -0,0 +1,319 @@
+"""Кэширование с поколениями (generation counters).
+
+У каждой области (scope) вроде ``post:12`` или ``group:3`` есть счётчик
+поколения в кэше. Номер поколения входит в ключи закэшированных данных,
+поэтому сброс области - это один инкремент, а старые записи просто
+перестают читаться и вытесняются по TTL.
+
+Страницы и карточки читаются через fetch(), который защищает базу от
+лавины пересчётов (cache stampede), когда запись истекает под нагрузкой,
+и считает их по основной базе, а не по отстающей реплике.
+"""
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from core.replicas import primary_reads, read_replica
+
+from . import metrics
+from .constants import (CACHE_LOCK_POLL, CACHE_LOCK_TIMEOUT, CACHE_LOCK_WAIT,
+                        PAGE_CACHE_TIMEOUT, POST_CARD_TIMEOUT, STALE_TIMEOUT,
+                        XFETCH_BETA)
+
+
+def _generation_key(scope):
+    return f'gen:{scope}'
+
+
+def _initial_generation():
+    # Счётчик может пропасть из кэша. Начинаем со времени в мкс,
+    # чтобы новое поколение было больше любого выданного раньше.
+    return time.time_ns() // 1000
+
+
+def _modified_key(scope):
+    return f'modified:{scope}'
+
+
+def _get_counters(initials):
+    """Значения ключей initials одним обращением к кэшу; пропавшие
+    заводятся значением initials[key]()."""
+    found = cache.get_many(list(initials))
+    for key, initial in initials.items():
+        if key in found:
+            continue
+        value = initial()
+        if not cache.add(key, value, None):
+            value = cache.get(key, value)
+        found[key] = value
+
+    return found
+
+
+def get_generations(*scopes):
+    """Текущие поколения областей одним обращением к кэшу."""
+    found = _get_counters({
+        _generation_key(scope): _initial_generation for scope in scopes})
+
+    return tuple(found[_generation_key(scope)] for scope in scopes)
+
+
+def get_versions(*scopes):
+    """Поколения областей и время (timestamp) последнего сброса любой
+    из них одним обращением к кэшу.
+
+    Если отметка времени пропала из кэша, она заводится текущим
+    временем: клиенты один лишний раз получат страницу целиком.
+    """
+    initials = {
+        _generation_key(scope): _initial_generation for scope in scopes}
+    initials.update({_modified_key(scope): time.time for scope in scopes})
+    found = _get_counters(initials)
+
+    return (
+        tuple(found[_generation_key(scope)] for scope in scopes),
+        max(found[_modified_key(scope)] for scope in scopes),
+    )
+
+
+def bump_generation(*scopes):
+    """Сбрасывает области, увеличивая их поколения, после фиксации
+    текущей транзакции.
+
+    Если сбросить раньше, другой запрос успеет прочитать старые данные
+    под новым поколением и закэширует их на весь срок записи. При откате
+    транзакции поколения не меняются; вне транзакции сброс сразу.
+    """
+    scopes = tuple(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def _bump(scopes):
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), None)
+    now = time.time()
+    cache.set_many({_modified_key(scope): now for scope in scopes}, None)
+
+
+def post_scopes(post, previous_group_slug=None):
+    """Области, которые сбрасываются при изменении поста."""
+    scopes = {
+        f'post:{post.pk}',
+        'index',
+        f'profile_page:{post.author.username}',
+    }
+    slugs = (post.group.slug if post.group_id else None, previous_group_slug)
+    scopes.update(f'group_page:{slug}' for slug in slugs if slug)
+
+    return scopes
+
+
+def card_key(post, view_name):
+    """Ключ HTML-карточки поста для страницы view_name."""
+    post_generation, group_generation = get_generations(
+        f'post:{post.pk}', f'group:{post.group_id}')
+
+    return (f'post_card:{post.pk}:{post_generation}:'
+            f'{group_generation}:{view_name}')
+
+
+def _lock_key(key):
+    return f'lock:{key}'
+
+
+def _compute(key, compute, timeout, cacheable):
+    """Считает значение и кладёт его в кэш вместе с длительностью
+    расчёта и мягким сроком годности."""
+    start = time.time()
+    with primary_reads():
+        value = compute()
+    if cacheable is None or cacheable(value):
+        now = time.time()
+        cache.set(key, (value, now - start, now + timeout),
+                  timeout + STALE_TIMEOUT)
+
+    return value
+
+
+def _expired(delta, expires, beta=XFETCH_BETA):
+    """Пора ли пересчитывать запись (XFetch): чем дольше расчёт delta
+    и ближе срок expires, тем вероятнее пересчёт раньше срока."""
+    return time.time() - delta * beta * math.log(
+        1 - random.random()) >= expires
+
+
+def _get_entry(key):
+    entry = cache.get(key)
+    # Записи прежних версий - без срока и длительности расчёта.
+    return entry if isinstance(entry, tuple) else None
+
+
+def _lock(key):
+    return cache.add(_lock_key(key), 1, CACHE_LOCK_TIMEOUT)
+
+
+def _wait(key):
+    """Ждёт до CACHE_LOCK_WAIT секунд, пока другой запрос посчитает
+    запись. Возвращает (запись или None, взята ли блокировка)."""
+    deadline = time.monotonic() + CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(CACHE_LOCK_POLL)
+        entry = _get_entry(key)
+        if entry is not None:
+            return entry, False
+        if _lock(key):
+            return None, True
+
+    return None, False
+
+
+def fetch(key, compute, timeout, metric, cacheable=None):
+    """Значение из кэша или compute(), защищённое от лавины пересчётов.
+
+    Запись живёт timeout секунд и ещё STALE_TIMEOUT после срока.
+    Незадолго до срока (вероятностно) или после него запрос, взявший
+    блокировку, пересчитывает запись, а остальные получают старое
+    значение. При промахе считает один запрос, остальные ждут его
+    результата до CACHE_LOCK_WAIT секунд. Значения, для которых
+    cacheable(value) ложно, не кэшируются.
+    """
+    entry = _get_entry(key)
+    if not getattr(settings, 'CACHE_STAMPEDE_PROTECTION', True):
+        if entry is not None and entry[2] > time.time():
+            metrics.cache_result(metric, 'hit')
+            return entry[0]
+        metrics.cache_result(metric, 'miss')
+        return _compute(key, compute, timeout, cacheable)
+    if entry is not None:
+        value, delta, expires = entry
+        if not _expired(delta, expires):
+            metrics.cache_result(metric, 'hit')
+            return value
+        locked = _lock(key)
+        if not locked:
+            metrics.cache_result(metric, 'stale')
+            return value
+    else:
+        locked = _lock(key)
+        if not locked:
+            entry, locked = _wait(key)
+            if entry is not None:
+                metrics.cache_result(metric, 'wait')
+                return entry[0]
+    metrics.cache_result(metric, 'miss')
+    try:
+        return _compute(key, compute, timeout, cacheable)
+    finally:
+        if locked:
+            cache.delete(_lock_key(key))
+
+
+def get_card(post, view_name, render):
+    """HTML карточки из кэша; при промахе рендерит и кладёт в кэш.
+
+    Карточка поста, прочитанного из реплики, не кэшируется: он может
+    быть старше текущего поколения.
+    """
+    stale = post._state.db in getattr(settings, 'DATABASE_REPLICAS', ())
+
+    return fetch(
+        card_key(post, view_name), render, POST_CARD_TIMEOUT, 'fragment',
+        cacheable=lambda value: not stale)
+
+
+def page_key(request, view_name, generations):
+    """Ключ страницы: view, поколения, пользователь и полный путь."""
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    generation = '.'.join(map(str, generations))
+
+    return f'page:{view_name}:{generation}:{request.user.pk or 0}:{path}'
+
+
+def cache_page_by_generation(*scopes, timeout=PAGE_CACHE_TIMEOUT):
+    """Кэширует GET-ответы view, пока не сменятся поколения scopes.
+
+    Области задаются шаблонами строк, в которые подставляются
+    именованные аргументы view, например ``'group_page:{slug}'``.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            generations = get_generations(
+                *(scope.format(**kwargs) for scope in scopes))
+            key = page_key(request, view.__name__, generations)
+
+            return fetch(
+                key, lambda: view(request, *args, **kwargs), timeout,
+                'page', cacheable=lambda response: (
+                    response.status_code == 200 and not response.cookies))
+
+        return wrapper
+
+    return decorator
+
+
+def condition_by_generation(*scopes, resolve=None):
+    """Слабый ETag и Last-Modified для GET-ответов view по поколениям
+    областей, без рендеринга: если клиент прислал совпадающие
+    валидаторы, view не вызывается и ответ - 304 Not Modified.
+
+    Области задаются шаблонами, как в cache_page_by_generation.
+    resolve(**kwargs) возвращает ещё области страницы и время последнего
+    изменения её данных в базе, а если объекта нет - None, и тогда
+    отвечает сам view. Ответ можно хранить в браузере и CDN, но перед
+    показом его надо перепроверить (Cache-Control: no-cache). Ответ,
+    прочитанный из реплики, валидаторов не получает: он может быть
+    старше поколений, из которых собран ETag.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            page_scopes = [scope.format(**kwargs) for scope in scopes]
+            changed = None
+            if resolve is not None:
+                with primary_reads():
+                    resolved = resolve(**kwargs)
+                if resolved is None:
+                    return view(request, *args, **kwargs)
+                extra_scopes, changed = resolved
+                page_scopes += extra_scopes
+            generations, bumped = get_versions(*page_scopes)
+            if changed is not None:
+                bumped = max(bumped, changed.timestamp())
+            # Время из базы - на случай записей в обход сигналов.
+            key = f'{page_key(request, view.__name__, generations)}:{bumped}'
+            etag = f'W/"{hashlib.md5(key.encode()).hexdigest()}"'
+            last_modified = int(bumped)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code == 304 or (
+                    response.status_code == 200 and not read_replica()):
+                response.setdefault('ETag', etag)
+                response.setdefault('Last-Modified', http_date(last_modified))
+                patch_cache_control(
+                    response, no_cache=True,
+                    private=request.user.is_authenticated)
+
+            return response
+
+        return wrapper
+
+    return decorator
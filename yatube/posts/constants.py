@@ -6,3 +6,100 @@ TEST_PAGE_2 = 6
 
 """Константа количества выведенных символов в модели Post."""
 POST_NUM = 15
+
+"""Порог подписчиков, после которого посты автора не раскладываются
+по лентам подписчиков, а читаются при показе ленты."""
+FANOUT_LIMIT = 1000
+
+"""Сколько последних постов автора попадает в ленту при подписке."""
+TIMELINE_BACKFILL = 1000
+
+"""Время жизни закэшированной карточки поста, секунд."""
+POST_CARD_TIMEOUT = 60 * 60 * 24
+
+"""Время жизни закэшированной страницы ленты, секунд. Страницы
+сбрасываются поколениями, поэтому время может быть большим."""
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+"""Константа количества комментариев на странице поста."""
+COMMENTS_NUM = 20
+
+"""Размеры миниатюр картинок постов, которые готовятся заранее:
+геометрия sorl -> параметры обрезки."""
+THUMBNAIL_SIZES = {
+    '960x339': {'crop': 'center', 'upscale': True},
+}
+
+"""Число потоков, в которых готовятся миниатюры."""
+THUMBNAIL_WORKERS = 2
+
+"""Время жизни адреса готовой миниатюры в кэше, секунд."""
+THUMBNAIL_TIMEOUT = 60 * 60 * 24 * 30
+
+"""Сколько секунд миниатюра считается поставленной в очередь: за это
+время повторно её не ставим, даже если генерация упала."""
+THUMBNAIL_PENDING_TIMEOUT = 60 * 5
+
+"""Константа количества результатов поиска на странице."""
+SEARCH_NUM = 10
+
+"""Максимальная длина термина в поисковом индексе."""
+SEARCH_TERM_LENGTH = 64
+
+"""Сколько строк выгрузки читается из базы за раз."""
+EXPORT_CHUNK_SIZE = 2000
+
+"""Размер блока потоковой выгрузки, байт."""
+EXPORT_BLOCK_SIZE = 64 * 1024
+
+"""Сколько строк импорта пишется в базу одной транзакцией."""
+IMPORT_BATCH_SIZE = 1000
+
+"""Сколько ошибок импорта выводить подробно."""
+IMPORT_ERRORS_SHOWN = 20
+
+"""Сколько основ слов запоминает стеммер поиска."""
+STEM_CACHE_SIZE = 100000
+
+"""Параметры генератора синтетических данных (manage.py seed):
+строк в одной пачке bulk_create, показатель степенного закона
+популярности, за сколько дней идут посты, доля постов с картинкой."""
+SEED_BATCH_SIZE = 10000
+SEED_ZIPF_ALPHA = 1.1
+SEED_DAYS = 365
+SEED_IMAGE_SHARE = 0.1
+
+"""Время жизни закэшированного числа объектов для паджинатора, секунд.
+Числа сбрасываются поколениями; время ограничивает устаревание там,
+где поколения не сбрасываются (новые посты в ленте подписок)."""
+COUNT_CACHE_TIMEOUT = 60 * 5
+
+"""С какого числа строк в таблице вместо COUNT(*) берётся оценка
+планировщика."""
+ESTIMATE_MIN_ROWS = 100000
+
+"""Сколько номеров страниц показывать по обе стороны от текущей."""
+PAGE_WINDOW = 2
+
+"""Сколько первых и последних номеров страниц показывать всегда."""
+PAGE_ENDS = 1
+
+"""Сколько секунд после срока годности страница или карточка ещё
+отдаётся устаревшей, пока один запрос пересчитывает её."""
+STALE_TIMEOUT = 60
+
+"""Время жизни блокировки пересчёта записи кэша, секунд: если
+пересчитывающий запрос упал, другие возьмутся за пересчёт не позже."""
+CACHE_LOCK_TIMEOUT = 10
+
+"""Сколько секунд запрос ждёт чужого пересчёта при промахе, прежде чем
+посчитать сам, и через сколько секунд проверяет кэш снова."""
+CACHE_LOCK_WAIT = 5
+CACHE_LOCK_POLL = 0.02
+
+"""Коэффициент beta вероятностного раннего пересчёта (XFetch): чем он
+больше, тем раньше срока запись начинают пересчитывать."""
+XFETCH_BETA = 1.0
+
+"""Наибольший размер страницы JSON API (?limit=)."""
+API_MAX_LIMIT = 1000
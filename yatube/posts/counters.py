@@ -0,0 +1,109 @@
+"""Денормализованные счётчики пользователя (UserStats).
+
+Счётчики меняются сигналами одним UPDATE с F()-выражением, поэтому
+карточки автора и профиля показываются без COUNT(*).
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserStats
+
+"""Поле счётчика и запрос, по которому он пересчитывается."""
+SOURCES = {
+    'posts_count': (Post.objects, 'author'),
+    'followers_count': (Follow.objects, 'author'),
+    'following_count': (Follow.objects, 'user'),
+    'comments_count': (Comment.objects, 'author'),
+}
+
+
+def bump(user_id, **deltas):
+    """Атомарно меняет счётчики пользователя на deltas.
+
+    Если строки счётчиков ещё нет, при увеличении она создаётся
+    пересчётом. При уменьшении недостающая строка не создаётся:
+    так бывает при каскадном удалении пользователя.
+    """
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()})
+    if not updated and any(delta > 0 for delta in deltas.values()):
+        UserStats.objects.get_or_create(
+            user_id=user_id, defaults=recount([user_id])[user_id])
+
+
+def refresh(user_ids, *fields):
+    """Пересчитывает счётчики fields пользователей user_ids по таблицам.
+
+    Один UPDATE с подзапросом на поле: значение берётся из базы в
+    момент записи, а не складывается из изменений, которые насчитал
+    вызывающий, поэтому параллельные массовые записи не сбивают
+    счётчики. Недостающие строки создаются пересчётом.
+    """
+    for field in fields:
+        queryset, user_field = SOURCES[field]
+        total = queryset.filter(**{user_field: OuterRef('user_id')}).order_by(
+        ).values(user_field).annotate(total=Count('id')).values('total')
+        UserStats.objects.filter(user_id__in=user_ids).update(
+            **{field: Coalesce(Subquery(total), 0)})
+    missing = set(user_ids) - set(UserStats.objects.filter(
+        user_id__in=user_ids).values_list('user_id', flat=True))
+    if missing:
+        UserStats.objects.bulk_create([
+            UserStats(user_id=user_id, **counts)
+            for user_id, counts in recount(missing).items()
+        ], ignore_conflicts=True)
+
+
+def recount(user_ids=None):
+    """Считает счётчики по таблицам: {user_id: {поле: значение}}."""
+    users = User.objects.all()
+    if user_ids is not None:
+        users = users.filter(id__in=user_ids)
+    result = {
+        user_id: dict.fromkeys(SOURCES, 0)
+        for user_id in users.values_list('id', flat=True)
+    }
+    for field, (queryset, user_field) in SOURCES.items():
+        if user_ids is not None:
+            queryset = queryset.filter(**{f'{user_field}__in': user_ids})
+        rows = queryset.order_by().values(user_field).annotate(
+            total=Count('id')).values_list(user_field, 'total')
+        for user_id, total in rows:
+            result[user_id][field] = total
+
+    return result
+
+
+def rebuild(user_ids=None, verify=False):
+    """Сверяет счётчики с таблицами и, если не verify, чинит их.
+
+    Возвращает список (user_id, поле, сохранено, посчитано) для
+    расхождений; для отсутствующей строки сохранено равно None.
+    """
+    expected = recount(user_ids)
+    stored = UserStats.objects.in_bulk(list(expected))
+    mismatches = []
+    to_update, to_create = [], []
+    for user_id, counts in expected.items():
+        stats = stored.get(user_id)
+        if stats is None:
+            mismatches += [
+                (user_id, field, None, value)
+                for field, value in counts.items()
+            ]
+            to_create.append(UserStats(user_id=user_id, **counts))
+            continue
+        changed = False
+        for field, value in counts.items():
+            if getattr(stats, field) != value:
+                mismatches.append(
+                    (user_id, field, getattr(stats, field), value))
+                setattr(stats, field, value)
+                changed = True
+        if changed:
+            to_update.append(stats)
+    if not verify:
+        UserStats.objects.bulk_create(to_create)
+        UserStats.objects.bulk_update(to_update, list(SOURCES))
+
+    return mismatches
@@ -0,0 +1,96 @@
+"""Потоковая выгрузка постов, комментариев, групп и подписок.
+
+Строки читаются из базы итератором по chunk_size штук и сразу
+превращаются в NDJSON или CSV, поэтому память не зависит от размера
+таблицы. Сжатие gzip тоже идёт потоком.
+"""
+import csv
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .constants import EXPORT_BLOCK_SIZE, EXPORT_CHUNK_SIZE
+from .models import Comment, Follow, Group, Post
+
+"""Выгружаемые таблицы: имя -> (модель, поля)."""
+EXPORTS = {
+    'posts': (Post, ('id', 'text', 'pub_date', 'author_id', 'group_id',
+                     'image')),
+    'comments': (Comment, ('id', 'post_id', 'author_id', 'text',
+                           'created')),
+    'groups': (Group, ('id', 'title', 'slug', 'description')),
+    'follows': (Follow, ('id', 'user_id', 'author_id')),
+}
+
+"""Форматы выгрузки: имя -> Content-Type."""
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def rows(name, chunk_size=EXPORT_CHUNK_SIZE):
+    """Кортежи полей таблицы name по возрастанию id."""
+    model, fields = EXPORTS[name]
+
+    return model.objects.order_by('pk').values_list(*fields).iterator(
+        chunk_size=chunk_size)
+
+
+def ndjson_lines(name, chunk_size=EXPORT_CHUNK_SIZE):
+    _, fields = EXPORTS[name]
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows(name, chunk_size):
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+class _Echo:
+    """Файл для csv.writer, который просто возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(name, chunk_size=EXPORT_CHUNK_SIZE):
+    _, fields = EXPORTS[name]
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows(name, chunk_size):
+        yield writer.writerow(row)
+
+
+def blocks(lines, size=EXPORT_BLOCK_SIZE):
+    """Склеивает строки в блоки байтов примерно по size."""
+    block, length = [], 0
+    for line in lines:
+        data = line.encode()
+        block.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(block)
+            block, length = [], 0
+    if block:
+        yield b''.join(block)
+
+
+def gzipped(chunks):
+    """Сжимает поток байтов в формат gzip на лету."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(name, fmt='ndjson', gzip=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Байты выгрузки таблицы name в формате fmt."""
+    lines = ndjson_lines if fmt == 'ndjson' else csv_lines
+    chunks = blocks(lines(name, chunk_size))
+
+    return gzipped(chunks) if gzip else chunks
+
+
+def filename(name, fmt, gzip=False):
+    """Имя файла выгрузки, например posts.csv.gz."""
+    return f'{name}.{fmt}.gz' if gzip else f'{name}.{fmt}'
@@ -0,0 +1,166 @@
+"""Массовые подписки и отписки.
+
+Нужный набор пар (подписчик, автор) сравнивается с тем, что уже есть
+в базе, одним запросом, новые пары пишутся одним bulk_create, а лишние
+удаляются одним DELETE на подписчика. Добавление сверяет пары под
+блокировкой таблицы подписок (importing.lock_table), поэтому
+созданными считаются только пары, которые записал сам вызов.
+Сигналы при этом не срабатывают, поэтому счётчики, ленты и поколения
+кэша обновляются здесь же сразу для всех пар. Счётчики пересчитываются
+по таблицам, а не сдвигаются на число пар: параллельный импорт тех же
+пар не даёт им разойтись.
+"""
+from django.db import transaction
+
+from . import caching, counters, metrics, timeline
+from .constants import FANOUT_LIMIT, IMPORT_BATCH_SIZE
+from .importing import lock_table
+from .models import Follow, User, UserStats
+
+
+def existing(pairs):
+    """Какие из пар pairs уже есть в базе."""
+    if not pairs:
+        return set()
+    found = Follow.objects.filter(
+        user_id__in={user_id for user_id, _ in pairs},
+        author_id__in={author_id for _, author_id in pairs},
+    ).values_list('user_id', 'author_id')
+
+    return set(found) & set(pairs)
+
+
+def _group(pairs):
+    """{user_id: {author_id}} из пар."""
+    authors = {}
+    for user_id, author_id in pairs:
+        authors.setdefault(user_id, set()).add(author_id)
+
+    return authors
+
+
+def _bump_profiles(pairs):
+    user_ids = {user_id for pair in pairs for user_id in pair}
+    caching.bump_generation(*(
+        f'profile_page:{username}' for username in User.objects.filter(
+            id__in=user_ids).values_list('username', flat=True)))
+
+
+def _refresh_counters(pairs):
+    counters.refresh(
+        {user_id for user_id, _ in pairs}, 'following_count')
+    counters.refresh(
+        {author_id for _, author_id in pairs}, 'followers_count')
+
+
+@transaction.atomic
+def add(pairs):
+    """Создаёт подписки pairs [(user_id, author_id)], которых ещё нет;
+    подписки на себя пропускаются. Возвращает созданные пары."""
+    pairs = {(user_id, author_id) for user_id, author_id in pairs
+             if user_id != author_id}
+    if not pairs:
+        return set()
+    # До конца транзакции подписки больше никто не добавит: пары,
+    # которых нет сейчас, запишет именно этот вызов.
+    lock_table(Follow)
+    new = pairs - existing(pairs)
+    if not new:
+        return set()
+    Follow.objects.bulk_create(
+        [Follow(user_id=user_id, author_id=author_id)
+         for user_id, author_id in new],
+        ignore_conflicts=True,
+    )
+    after_add(new)
+    metrics.CREATED.inc(len(new), model='follow')
+
+    return new
+
+
+def after_add(pairs):
+    """Счётчики, ленты и кэш профилей для новых подписок pairs."""
+    _refresh_counters(pairs)
+    timeline.backfill_many(pairs)
+    _bump_profiles(pairs)
+
+
+@transaction.atomic
+def remove(pairs):
+    """Удаляет подписки pairs, которые есть. Возвращает удалённые пары."""
+    gone = existing(set(pairs))
+    if not gone:
+        return set()
+    author_ids = {author_id for _, author_id in gone}
+    popular = set(UserStats.objects.filter(
+        user_id__in=author_ids, followers_count__gt=FANOUT_LIMIT,
+    ).values_list('user_id', flat=True))
+    for user_id, user_authors in _group(gone).items():
+        Follow.objects.filter(
+            user_id=user_id, author_id__in=user_authors).delete_quietly()
+    _refresh_counters(gone)
+    timeline.drop_many(gone)
+    _bump_profiles(gone)
+    # Авторы, которые опустились до порога, снова раскладываются.
+    for author_id in UserStats.objects.filter(
+            user_id__in=popular, followers_count__lte=FANOUT_LIMIT,
+    ).values_list('user_id', flat=True):
+        timeline.rebuild_author(author_id)
+
+    return gone
+
+
+@transaction.atomic
+def sync(graph, replace=False):
+    """Приводит подписки пользователей к графу {user_id: {author_id}}.
+
+    Недостающие подписки создаются; с replace удаляются и подписки
+    этих пользователей на авторов, которых нет в графе.
+    Возвращает (созданные, удалённые) пары.
+    """
+    wanted = {
+        (user_id, author_id)
+        for user_id, author_ids in graph.items() for author_id in author_ids
+    }
+    removed = set()
+    if replace:
+        current = set(Follow.objects.filter(
+            user_id__in=graph).values_list('user_id', 'author_id'))
+        removed = remove(current - wanted)
+
+    return add(wanted), removed
+
+
+def import_graph(pairs, replace=False, batch_size=IMPORT_BATCH_SIZE,
+                 on_batch=None):
+    """Импортирует граф подписок из пар [(user_id, author_id)].
+
+    Пары обрабатываются пачками примерно по batch_size. С replace
+    граф каждого пользователя в файле считается полным, поэтому его
+    пары должны идти подряд: пачка закрывается только на смене
+    пользователя. Возвращает число созданных и удалённых подписок;
+    on_batch(созданные, удалённые) вызывается после каждой пачки.
+    """
+    added = removed = 0
+    graph, size, last_user = {}, 0, None
+
+    def flush():
+        nonlocal added, removed
+        new, gone = sync(graph, replace)
+        added += len(new)
+        removed += len(gone)
+        graph.clear()
+        if on_batch is not None:
+            on_batch(added, removed)
+
+    for user_id, author_id in pairs:
+        if size >= batch_size and user_id != last_user:
+            flush()
+            size = 0
+        graph.setdefault(user_id, set()).add(author_id)
+        size += 1
+        last_user = user_id
+    if graph:
+        flush()
+
+    return added, removed
@@ -0,0 +1,380 @@
+"""Массовый импорт постов, комментариев и подписок из NDJSON или CSV.
+
+Строки читаются потоком и обрабатываются пачками: каждая пачка
+проверяется, авторы и группы находятся по таблицам в памяти, а запись
+идёт через bulk_create в своей транзакции. При bulk_create сигналы
+не срабатывают, поэтому счётчики, ленты, поисковый индекс и поколения
+кэша обновляются после каждой пачки сразу для всех её строк.
+Подписки только разбираются здесь (follow_pairs), а пишет их
+posts/follows.py.
+"""
+import abc
+import csv
+import gzip
+import json
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import NotSupportedError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import caching, counters, metrics, search, timeline
+from .constants import IMPORT_BATCH_SIZE
+from .models import Comment, Group, Post, User
+
+FORMATS = ('ndjson', 'csv')
+
+
+class RowError(Exception):
+    """Строку нельзя импортировать."""
+
+
+def open_input(path):
+    """Текстовый файл ввода; .gz распаковывается на лету."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def guess_format(path):
+    """Формат по расширению файла, по умолчанию ndjson."""
+    name = path[:-len('.gz')] if path.endswith('.gz') else path
+    return 'csv' if name.endswith('.csv') else 'ndjson'
+
+
+def read_rows(lines, fmt):
+    """Словари строк ввода с номерами: (номер, строка)."""
+    if fmt == 'csv':
+        yield from enumerate(csv.DictReader(lines), start=2)
+        return
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _parse_date(value):
+    """Дата из ISO 8601; наивная дата считается в TIME_ZONE."""
+    if not value:
+        return None
+    date = parse_datetime(value)
+    if date is None:
+        raise RowError(f'некорректная дата {value!r}')
+    if settings.USE_TZ and timezone.is_naive(date):
+        date = timezone.make_aware(date)
+
+    return date
+
+
+def lock_table(model):
+    """Запрещает другим транзакциям вставлять строки model до конца
+    текущей, чтобы id, выданные по Max(pk), не заняла запись сайта.
+
+    PostgreSQL: LOCK TABLE (чтение не блокируется). SQLite пускает
+    писать одну транзакцию за раз: пустой UPDATE сразу берёт блокировку
+    записи, а не при первой вставке. Для остальных СУБД блокировка
+    не написана, и импорт с выдачей id на них не запускается.
+    """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f'LOCK TABLE {connection.ops.quote_name(table)} '
+                f'IN SHARE ROW EXCLUSIVE MODE')
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                'UPDATE sqlite_sequence SET seq = seq WHERE name = %s',
+                [table])
+        else:
+            raise NotSupportedError(
+                f'Выдача id при импорте не поддерживается для '
+                f'{connection.vendor}.')
+
+
+def reset_sequences(*models):
+    """Переводит последовательности id за id, выданные вручную."""
+    with connection.cursor() as cursor:
+        for statement in connection.ops.sequence_reset_sql(
+                no_style(), models):
+            cursor.execute(statement)
+
+
+def insert(objects, date_field=None):
+    """bulk_create объектов одной модели с id после последнего в таблице.
+
+    id выдаются самим: bulk_create на SQLite их не возвращает, а они
+    нужны для производных данных и для дат. Django подставляет в поле
+    auto_now_add date_field текущее время, поэтому заданные у объектов
+    даты возвращаются bulk_update по id. Вызывается в транзакции: таблица
+    заблокирована до её конца, а последовательность id переводится
+    в той же транзакции, и сбой не оставляет её позади строк.
+    """
+    model = type(objects[0])
+    lock_table(model)
+    last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    for number, obj in enumerate(objects, start=1):
+        obj.pk = last_pk + number
+    dated = [
+        (obj, getattr(obj, date_field)) for obj in objects
+        if date_field and getattr(obj, date_field) is not None
+    ]
+    model.objects.bulk_create(objects)
+    for obj, date in dated:
+        setattr(obj, date_field, date)
+    if dated:
+        model.objects.bulk_update(
+            [obj for obj, _ in dated], [date_field])
+    reset_sequences(model)
+
+
+class UserLookup:
+    """Пользователи по имени и по id.
+
+    Загружаются в память один раз: их на порядки меньше, чем постов,
+    комментариев и подписок.
+    """
+
+    def __init__(self):
+        self.ids = dict(User.objects.values_list('username', 'id'))
+        self.names = {
+            user_id: username for username, user_id in self.ids.items()}
+
+    def id(self, row, field):
+        """id пользователя по имени (field) или по id (field_id)."""
+        username, user_id = row.get(field), row.get(f'{field}_id')
+        if username:
+            if username not in self.ids:
+                raise RowError(f'нет пользователя {username!r}')
+            return self.ids[username]
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            raise RowError(f'не указан {field}')
+        if user_id not in self.names:
+            raise RowError(f'нет пользователя с id {user_id}')
+
+        return user_id
+
+
+class Importer(abc.ABC):
+    """Импорт одной таблицы; наследники описывают строки и пост-обработку.
+
+    Группы, как и пользователи, загружаются в память один раз.
+    """
+
+    model = None
+    # Поле auto_now_add, значение которого можно передать в файле.
+    date_field = None
+    clean_exclude = ()
+
+    def __init__(self):
+        self.users = UserLookup()
+
+    @abc.abstractmethod
+    def build(self, row):
+        """Объект модели из строки или RowError."""
+
+    def prepare(self, batch):
+        """Объекты пачки и ошибки [(номер строки, текст)]."""
+        objects, errors = [], []
+        for number, row in batch:
+            try:
+                if not isinstance(row, dict):
+                    raise RowError('строка не разбирается')
+                obj = self.build(row)
+                obj.clean_fields(exclude=self.clean_exclude)
+            except RowError as error:
+                errors.append((number, str(error)))
+            except ValidationError as error:
+                errors.append((number, '; '.join(
+                    f'{field}: {" ".join(messages)}'
+                    for field, messages in error.message_dict.items())))
+            else:
+                obj.import_number = number
+                objects.append(obj)
+
+        return self.filter(objects, errors), errors
+
+    def filter(self, objects, errors):
+        """Отбрасывает объекты, которые нельзя записать всей пачкой."""
+        return objects
+
+    def save(self, objects):
+        """Записывает пачку в её транзакции (см. insert()); даты, которых
+        нет в файле, ставит auto_now_add."""
+        if self.date_field is not None:
+            for obj in objects:
+                setattr(obj, self.date_field, obj.import_date)
+        insert(objects, self.date_field)
+
+    def after_save(self, objects):
+        """Обновляет производные данные записанной пачки."""
+
+
+class PostImporter(Importer):
+    """Посты: text, author или author_id, group или group_id, pub_date."""
+
+    model = Post
+    date_field = 'pub_date'
+    clean_exclude = ('author', 'group', 'pub_date')
+
+    def __init__(self):
+        super().__init__()
+        self.groups = dict(Group.objects.values_list('slug', 'id'))
+        self.group_ids = set(self.groups.values())
+        self.slugs = {
+            group_id: slug for slug, group_id in self.groups.items()}
+
+    def group_id(self, row):
+        slug, group_id = row.get('group'), row.get('group_id')
+        if slug:
+            if slug not in self.groups:
+                raise RowError(f'нет группы {slug!r}')
+            return self.groups[slug]
+        if group_id in (None, ''):
+            return None
+        try:
+            group_id = int(group_id)
+        except ValueError:
+            raise RowError(f'некорректный group_id {group_id!r}')
+        if group_id not in self.group_ids:
+            raise RowError(f'нет группы с id {group_id}')
+
+        return group_id
+
+    def build(self, row):
+        post = Post(
+            text=row.get('text') or '',
+            author_id=self.users.id(row, 'author'),
+            group_id=self.group_id(row),
+            image=row.get('image') or '',
+        )
+        post.import_date = _parse_date(row.get('pub_date'))
+
+        return post
+
+    def after_save(self, objects):
+        for author_id, total in Counter(
+                post.author_id for post in objects).items():
+            counters.bump(author_id, posts_count=total)
+        timeline.fan_out_posts(objects)
+        search.get_index().add_many(objects)
+        scopes = {'index'}
+        scopes.update(
+            f'profile_page:{self.users.names[post.author_id]}'
+            for post in objects)
+        scopes.update(
+            f'group_page:{self.slugs[post.group_id]}'
+            for post in objects if post.group_id)
+        caching.bump_generation(*scopes)
+
+
+class CommentImporter(Importer):
+    """Комментарии: post_id, author или author_id, text, created."""
+
+    model = Comment
+    date_field = 'created'
+    clean_exclude = ('post', 'author', 'created')
+
+    def build(self, row):
+        try:
+            post_id = int(row.get('post_id'))
+        except (TypeError, ValueError):
+            raise RowError('не указан post_id')
+        comment = Comment(
+            post_id=post_id,
+            author_id=self.users.id(row, 'author'),
+            text=row.get('text') or '',
+        )
+        comment.import_date = _parse_date(row.get('created'))
+
+        return comment
+
+    def filter(self, objects, errors):
+        """Отбрасывает комментарии к несуществующим постам."""
+        post_ids = set(Post.objects.filter(
+            pk__in={comment.post_id for comment in objects},
+        ).values_list('pk', flat=True))
+        errors += [
+            (comment.import_number, f'нет поста с id {comment.post_id}')
+            for comment in objects if comment.post_id not in post_ids
+        ]
+
+        return [
+            comment for comment in objects if comment.post_id in post_ids]
+
+    def after_save(self, objects):
+        for author_id, total in Counter(
+                comment.author_id for comment in objects).items():
+            counters.bump(author_id, comments_count=total)
+        caching.bump_generation(
+            *{f'post:{comment.post_id}' for comment in objects})
+
+
+def follow_pairs(rows, errors):
+    """Пары (user_id, author_id) из строк подписок: user или user_id,
+    author или author_id. Ошибки дописываются в errors.
+
+    Записывает пары follows.import_graph (команда import_follows):
+    граф подписок сравнивается с базой как множество, а не построчно.
+    """
+    users = UserLookup()
+    for number, row in rows:
+        try:
+            if not isinstance(row, dict):
+                raise RowError('строка не разбирается')
+            user_id = users.id(row, 'user')
+            author_id = users.id(row, 'author')
+            if user_id == author_id:
+                raise RowError('нельзя подписаться на себя')
+        except RowError as error:
+            errors.append((number, str(error)))
+            continue
+        yield user_id, author_id
+
+
+IMPORTERS = {
+    'posts': PostImporter,
+    'comments': CommentImporter,
+}
+
+
+def run(table, rows, batch_size=IMPORT_BATCH_SIZE, on_batch=None):
+    """Импортирует строки rows [(номер, словарь)] в таблицу table.
+
+    Возвращает (записано, ошибки). on_batch(записано, ошибки)
+    вызывается после каждой пачки.
+    """
+    importer = IMPORTERS[table]()
+    saved, errors = 0, []
+    for batch in batches(rows, batch_size):
+        with transaction.atomic():
+            objects, batch_errors = importer.prepare(batch)
+            if objects:
+                importer.save(objects)
+                importer.after_save(objects)
+                metrics.CREATED.inc(
+                    len(objects), model=importer.model._meta.model_name)
+        saved += len(objects)
+        errors += batch_errors
+        if on_batch is not None:
+            on_batch(saved, errors)
+
+    return saved, errors
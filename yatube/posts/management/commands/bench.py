@@ -0,0 +1,164 @@
+import json
+import random
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from core.testing import isolated_caches
+from posts import benchmark, seeding
+from posts.models import Follow, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк страниц yatube: создаёт временную базу, наполняет её '
+        'синтетическими данными и прогоняет сценарии через тестовый '
+        'клиент, сообщая p50/p95/p99, RPS и число SQL-запросов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument('--follows', type=int, default=2000)
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора данных и выбора объектов.',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=100,
+            help='Запросов на каждый сценарий.',
+        )
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            choices=sorted(benchmark.SCENARIOS),
+            help='Сценарий; можно указать несколько раз. По умолчанию все.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Число потоков с одновременными запросами; больше 1 '
+                 'требует --db-file.',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Каждый из --requests прогонов - всплеск из --concurrency '
+                 'одновременных запросов к одной странице с пустым кэшем.',
+        )
+        parser.add_argument(
+            '--no-stampede-protection', action='store_true',
+            help='Отключить защиту кэша от лавины пересчётов, чтобы '
+                 'сравнить с ней.',
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.',
+        )
+        parser.add_argument(
+            '--db-file',
+            help='Файл временной базы SQLite вместо базы в памяти.',
+        )
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Не удалять временную базу и не наполнять её повторно.',
+        )
+        parser.add_argument('--output', help='Записать отчёт JSON в файл.')
+        parser.add_argument(
+            '--compare', help='Сравнить с отчётом JSON прошлого прогона.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests должен быть положительным.')
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency должен быть положительным.')
+        if options['concurrency'] > 1 and not options['db_file']:
+            raise CommandError(
+                'Потокам нужна общая база в файле: укажите --db-file.')
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as report_file:
+                previous = json.load(report_file)['scenarios']
+        settings_dict = connection.settings_dict
+        if options['db_file']:
+            # Копия: словарь общий с settings.DATABASES.
+            connection.settings_dict = dict(settings_dict, TEST=dict(
+                settings_dict['TEST'], NAME=options['db_file']))
+        runner = DiscoverRunner(verbosity=0, keepdb=options['keepdb'])
+        old_config = runner.setup_databases()
+        try:
+            # Свой кэш во временном каталоге: ключи временной базы не
+            # смешиваются с кэшем сайта, а cache.clear() его не трогает.
+            with tempfile.TemporaryDirectory() as cache_dir, \
+                    override_settings(
+                        CACHES=isolated_caches(cache_dir),
+                        CACHE_STAMPEDE_PROTECTION=not options[
+                            'no_stampede_protection']):
+                report = self.benchmark(options)
+        finally:
+            runner.teardown_databases(old_config)
+            connection.settings_dict = settings_dict
+        self.print_report(report['scenarios'])
+        if previous is not None:
+            self.print_comparison(previous, report['scenarios'])
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                json.dump(report, report_file, ensure_ascii=False, indent=2)
+
+    def benchmark(self, options):
+        rnd = random.Random(options['seed'])
+        if not Post.objects.exists():
+            seeding.seed(
+                users=options['users'],
+                groups=options['groups'],
+                posts=options['posts'],
+                comments=options['comments'],
+                follows=options['follows'],
+                random_seed=options['seed'],
+            )
+        reader = User.objects.filter(
+            id__in=Follow.objects.values('user_id')).first()
+        if reader is None:
+            raise CommandError('В базе нет ни одной подписки.')
+
+        def make_client():
+            client = Client()
+            client.force_login(reader)
+            return client
+
+        names = options['scenarios'] or list(benchmark.SCENARIOS)
+        scenarios = benchmark.run(
+            make_client(), names, options['requests'], rnd,
+            cold=options['cold'], concurrency=options['concurrency'],
+            make_client=make_client, burst=options['burst'])
+
+        return {
+            'config': {
+                key: options[key] for key in (
+                    'users', 'groups', 'posts', 'comments', 'follows',
+                    'seed', 'requests', 'cold', 'concurrency', 'burst',
+                    'no_stampede_protection')
+            },
+            'database': connection.vendor,
+            'scenarios': scenarios,
+        }
+
+    def print_report(self, scenarios):
+        self.stdout.write(
+            f'{"scenario":<16}{"p50":>9}{"p95":>9}{"p99":>9}'
+            f'{"rps":>9}{"queries":>9}{"burst":>9}')
+        for name, result in scenarios.items():
+            self.stdout.write(
+                f'{name:<16}{result["p50_ms"]:>9}{result["p95_ms"]:>9}'
+                f'{result["p99_ms"]:>9}{result["rps"]:>9}'
+                f'{result["queries_mean"]:>9}'
+                f'{result.get("queries_per_burst", ""):>9}')
+
+    def print_comparison(self, previous, scenarios):
+        for name, metric, old, new, change in benchmark.compare(
+                previous, scenarios):
+            self.stdout.write(
+                f'{name:<16}{metric:<8}{old:>10} -> {new:<10}{change:+}%')
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.constants import EXPORT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает таблицу в NDJSON или CSV без загрузки '
+        'её в память целиком.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=sorted(export.EXPORTS))
+        parser.add_argument(
+            '--format', dest='fmt', choices=sorted(export.FORMATS),
+            default='ndjson',
+        )
+        parser.add_argument(
+            '--gzip', action='store_true',
+            help='Сжать выгрузку gzip на лету.',
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл выгрузки; по умолчанию стандартный вывод.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+            help='Сколько строк читать из базы за раз.',
+        )
+
+    def handle(self, *args, table, fmt, gzip, output, chunk_size,
+               **options):
+        chunks = export.stream(table, fmt, gzip, chunk_size)
+        if output is None:
+            self.write_stdout(chunks, gzip)
+            return
+        with open(output, 'wb') as target:
+            for chunk in chunks:
+                target.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f'Выгружено в {output}'))
+
+    def write_stdout(self, chunks, gzip):
+        """Пишет выгрузку в self.stdout, чтобы её можно было перехватить
+        через call_command(stdout=...).
+
+        Байты идут в буфер потока, если он есть. В текстовый поток без
+        буфера (StringIO) пишется текст: блоки выгрузки состоят из целых
+        строк, а сжатую выгрузку туда не записать.
+        """
+        target = getattr(self.stdout, 'buffer', None)
+        if target is None:
+            if gzip:
+                raise CommandError(
+                    'Сжатую выгрузку нельзя записать в текстовый поток, '
+                    'укажите --output.')
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending='')
+            return
+        self.stdout.flush()
+        for chunk in chunks:
+            target.write(chunk)
+        target.flush()
@@ -0,0 +1,68 @@
+import sys
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import follows, importing
+from posts.constants import IMPORT_BATCH_SIZE, IMPORT_ERRORS_SHOWN
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует граф подписок (user, author) из NDJSON или CSV: '
+        'пачки сравниваются с базой как множества, новые подписки '
+        'пишутся одним bulk_create, а счётчики, ленты и кэш обновляются '
+        'сразу для всей пачки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл для импорта; "-" - стандартный ввод.')
+        parser.add_argument(
+            '--format', dest='fmt', choices=importing.FORMATS,
+            help='Формат ввода; по умолчанию по расширению файла.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+            help='Сколько подписок обрабатывать одной транзакцией.',
+        )
+        parser.add_argument(
+            '--replace', action='store_true',
+            help=('Файл содержит все подписки своих пользователей: '
+                  'остальные их подписки удаляются. Строки одного '
+                  'пользователя должны идти подряд.'),
+        )
+
+    def handle(self, *args, path, fmt, batch_size, replace, **options):
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+        fmt = fmt or importing.guess_format(path)
+        errors = []
+        started = time.perf_counter()
+
+        def progress(added, removed):
+            elapsed = time.perf_counter() - started
+            self.stderr.write(
+                f'{added} подписок добавлено, {removed} удалено, '
+                f'{len(errors)} ошибок, {elapsed:.1f} с')
+
+        try:
+            source = (nullcontext(sys.stdin) if path == '-'
+                      else importing.open_input(path))
+        except OSError as error:
+            raise CommandError(error)
+        with source as lines:
+            added, removed = follows.import_graph(
+                importing.follow_pairs(
+                    importing.read_rows(lines, fmt), errors), replace,
+                batch_size, progress)
+        elapsed = time.perf_counter() - started
+        for number, message in errors[:IMPORT_ERRORS_SHOWN]:
+            self.stderr.write(f'строка {number}: {message}')
+        if len(errors) > IMPORT_ERRORS_SHOWN:
+            self.stderr.write(
+                f'... и ещё ошибок: {len(errors) - IMPORT_ERRORS_SHOWN}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено подписок: {added}, удалено: {removed}, '
+            f'пропущено строк: {len(errors)}, {elapsed:.1f} с'))
@@ -0,0 +1,80 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.constants import NUM_PAGE
+from posts.models import Comment, Follow, Group, Post, UserStats
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает планы и время горячих запросов приложения posts. '
+        'Для сравнения до/после индексов запустите команду на '
+        'миграции 0012_userstats и на 0013_hot_query_indexes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--runs', type=int, default=50,
+            help='Сколько раз выполнить каждый запрос.',
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Вывести результат в JSON.',
+        )
+
+    def get_queries(self):
+        """Горячие запросы на самых нагруженных объектах базы."""
+        stats = UserStats.objects.order_by('-posts_count').first()
+        group = Group.objects.first()
+        post = Post.objects.order_by('-pub_date', '-id').first()
+        follow = Follow.objects.first()
+        if not (stats and group and post and follow):
+            raise CommandError(
+                'Нужны хотя бы один пост, группа и подписка в базе.')
+        posts = Post.objects.select_related('author', 'group').order_by(
+            '-pub_date', '-id')
+
+        return {
+            'index': posts[:NUM_PAGE],
+            'group_posts': posts.filter(group=group)[:NUM_PAGE],
+            'profile': posts.filter(author=stats.user_id)[:NUM_PAGE],
+            'comments': Comment.objects.filter(post=post).order_by(
+                '-created', '-id')[:NUM_PAGE],
+            'follow_probe': Follow.objects.filter(
+                user=follow.user_id, author=follow.author_id)[:1],
+        }
+
+    def measure(self, queryset, runs):
+        """Время выполнения запроса в миллисекундах."""
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+
+        return {
+            'mean_ms': round(statistics.mean(timings), 3),
+            'p95_ms': round(timings[int(len(timings) * 0.95) - 1], 3),
+        }
+
+    def handle(self, *args, runs=50, **options):
+        if runs < 1:
+            raise CommandError('--runs должен быть положительным.')
+        report = {}
+        for name, queryset in self.get_queries().items():
+            report[name] = {
+                'plan': queryset.explain(),
+                **self.measure(queryset, runs),
+            }
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False))
+            return
+        for name, result in report.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{name}: mean {result["mean_ms"]} ms, '
+                f'p95 {result["p95_ms"]} ms'))
+            self.stdout.write(result['plan'])
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько постов индексировать за один запрос.',
+        )
+
+    def handle(self, *args, batch_size=1000, **options):
+        with transaction.atomic():
+            total = search.rebuild(batch_size)
+        index = type(search.get_index()).__name__
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {total} ({index})'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики пользователей (UserStats).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сверить счётчики, ничего не записывая.',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='id пользователя; можно указать несколько раз.',
+        )
+
+    def handle(self, *args, verify=False, user_ids=None, **options):
+        mismatches = counters.rebuild(user_ids, verify=verify)
+        for user_id, field, stored, expected in mismatches:
+            self.stdout.write(
+                f'user={user_id} {field}: {stored} -> {expected}')
+        if verify and mismatches:
+            raise CommandError(
+                f'Расхождений в счётчиках: {len(mismatches)}')
+        action = 'Найдено' if verify else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} расхождений: {len(mismatches)}'))
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import seeding
+from posts.constants import (SEED_BATCH_SIZE, SEED_DAYS, SEED_IMAGE_SHARE,
+                             SEED_ZIPF_ALPHA)
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетической соцсетью для нагрузочных тестов: '
+        'степенное распределение подписчиков и активности, всплески '
+        'постов, группы разного размера, обсуждения и картинки. '
+        'При одном --seed данные одинаковые.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument(
+            '--images', type=int, default=20,
+            help='Сколько разных картинок сгенерировать в MEDIA_ROOT.',
+        )
+        parser.add_argument(
+            '--image-share', type=float, default=SEED_IMAGE_SHARE,
+            help='Доля постов с картинкой.',
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=SEED_ZIPF_ALPHA,
+            help='Показатель степенного закона популярности.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=SEED_DAYS,
+            help='За сколько дней распределены посты.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--batch-size', type=int, default=SEED_BATCH_SIZE,
+            help='Строк в одной пачке bulk_create.',
+        )
+
+    def handle(self, *args, **options):
+        if User.objects.filter(
+                username__startswith=seeding.USERNAME_PREFIX).exists():
+            raise CommandError('Синтетические данные в базе уже есть.')
+        if options['users'] < 2 and options['follows']:
+            raise CommandError('Для подписок нужно хотя бы 2 пользователя.')
+
+        def log(stage, seconds):
+            self.stdout.write(f'{stage:<10}{seconds:>8.1f} с')
+
+        seeding.seed(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            random_seed=options['seed'],
+            images=options['images'],
+            image_share=options['image_share'],
+            alpha=options['alpha'],
+            days=options['days'],
+            batch_size=options['batch_size'],
+            log=log,
+        )
+        self.stdout.write(self.style.SUCCESS('База наполнена.'))
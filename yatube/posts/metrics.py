@@ -0,0 +1,21 @@
+"""Метрики приложения posts для ``/metrics``."""
+from core.metrics import Counter, Histogram
+
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests_total',
+    'Обращения к кэшу страниц и карточек постов.',
+    ('cache', 'result'))
+THUMBNAIL_SECONDS = Histogram(
+    'yatube_thumbnail_generation_seconds',
+    'Время подготовки всех миниатюр картинки поста.',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+CREATED = Counter(
+    'yatube_objects_created_total',
+    'Созданные посты, комментарии и подписки.',
+    ('model',))
+
+
+def cache_result(cache_name, result):
+    """result: hit, miss, stale (отдано устаревшее, пока другой запрос
+    пересчитывает) или wait (дождались чужого пересчёта)."""
+    CACHE_REQUESTS.inc(cache=cache_name, result=result)
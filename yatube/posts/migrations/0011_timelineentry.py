@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:25
+
+from itertools import islice
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+# Значения posts/constants.py на момент миграции: как в
+# timeline.backfill(), посты авторов с подписчиками больше FANOUT_LIMIT
+# не раскладываются, а в ленту попадают TIMELINE_BACKFILL последних.
+FANOUT_LIMIT = 1000
+TIMELINE_BACKFILL = 1000
+BATCH_SIZE = 1000
+
+
+def fill_timelines(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    authors = list(Follow.objects.order_by().values('author_id').annotate(
+        followers=Count('id')).filter(
+            followers__lte=FANOUT_LIMIT).values_list('author_id', flat=True))
+
+    def entries():
+        for author_id in authors:
+            post_ids = list(Post.objects.filter(
+                author_id=author_id).order_by('-pub_date', '-id').values_list(
+                    'id', flat=True)[:TIMELINE_BACKFILL])
+            for user_id in Follow.objects.filter(
+                    author_id=author_id).values_list('user_id', flat=True):
+                for post_id in post_ids:
+                    yield TimelineEntry(user_id=user_id, post_id=post_id)
+
+    rows = entries()
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0010_follow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
-from .constants import POST_NUM
+from .constants import POST_NUM, SEARCH_TERM_LENGTH
 
 User = get_user_model()
 
@@ -52,6 +52,18 @@ class Post(models.Model):
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'), name='post_pub_date_idx'),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx',
+            ),
+        )
         verbose_name = "Пост"
         verbose_name_plural = "Список постов"
 
@@ -84,6 +96,12 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = (
+            models.Index(
+                fields=('post', '-created', '-id'),
+                name='comment_post_created_idx',
+            ),
+        )
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
 
@@ -91,9 +109,71 @@ class Comment(models.Model):
         return self.text[:POST_NUM]
 
 
+class FollowQuerySet(models.QuerySet):
+    def delete_quietly(self):
+        """Удаляет подписки одним DELETE, без post_delete на каждую
+        строку: счётчики и ленты обновляет вызывающий (posts/follows.py).
+        """
+        return self._raw_delete(self.db)
+
+
 class Follow(models.Model):
     """ Модель для подписок на автора. """
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='follower')
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='following')
+
+    objects = FollowQuerySet.as_manager()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'), name='unique_follow'),
+        )
+
+
+class TimelineEntry(models.Model):
+    """ Пост в готовой ленте подписок пользователя. """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='timeline_entries')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='unique_timeline_entry'),
+        )
+
+
+class UserStats(models.Model):
+    """ Счётчики пользователя, которые поддерживаются сигналами. """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0)
+
+    class Meta:
+        verbose_name = "Статистика пользователя"
+        verbose_name_plural = "Статистика пользователей"
+
+
+class PostTerm(models.Model):
+    """ Термин поста в обратном индексе поиска. """
+    term = models.CharField(max_length=SEARCH_TERM_LENGTH)
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='terms')
+    count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('term', 'post'), name='unique_post_term'),
+        )
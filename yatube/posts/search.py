@@ -0,0 +1,244 @@
+"""Полнотекстовый поиск по постам.
+
+Текст поста разбивается на слова, слова приводятся к основе
+(упрощённый стеммер Портера для русского языка) и кладутся в обратный
+индекс. На SQLite с FTS5 индекс - виртуальная таблица ``posts_post_fts``
+с ранжированием bm25, на остальных базах - таблица PostTerm.
+Индекс обновляется сигналами сохранения и удаления поста.
+"""
+import re
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import Count, Sum
+
+from .constants import SEARCH_TERM_LENGTH, STEM_CACHE_SIZE
+from .models import Post, PostTerm
+
+FTS_TABLE = 'posts_post_fts'
+
+WORD = re.compile(r'\w+')
+CYRILLIC = re.compile(r'[а-я]')
+RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$')
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$')
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|((?<=[ая])(ла|на|ете|йте|'
+    r'ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$')
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$')
+DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+DERIVATIONAL_SUFFIX = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem(word):
+    """Основа русского слова; остальные слова не меняются."""
+    match = RV.match(word)
+    if not CYRILLIC.search(word) or match is None:
+        return word
+    prefix, rv = match.groups()
+    temp = PERFECTIVE_GERUND.sub('', rv, 1)
+    if temp == rv:
+        rv = REFLEXIVE.sub('', rv, 1)
+        temp = ADJECTIVE.sub('', rv, 1)
+        if temp != rv:
+            rv = PARTICIPLE.sub('', temp, 1)
+        else:
+            temp = VERB.sub('', rv, 1)
+            rv = NOUN.sub('', rv, 1) if temp == rv else temp
+    else:
+        rv = temp
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if DERIVATIONAL.match(rv):
+        rv = DERIVATIONAL_SUFFIX.sub('', rv, 1)
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = SUPERLATIVE.sub('', rv, 1)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+
+    return prefix + rv
+
+
+def tokenize(text):
+    """Основы слов текста в порядке появления."""
+    return [
+        stem(word)[:SEARCH_TERM_LENGTH]
+        for word in WORD.findall(text.lower().replace('ё', 'е'))
+    ]
+
+
+_fts5_tables = {}
+
+
+def fts5_available():
+    """Есть ли в базе таблица FTS5 для поиска.
+
+    Таблица создаётся миграцией, поэтому ответ запоминается для базы.
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts5_tables:
+        _fts5_tables[name] = FTS_TABLE in (
+            connection.introspection.table_names())
+
+    return _fts5_tables[name]
+
+
+class FTS5Index:
+    """Индекс в виртуальной таблице SQLite FTS5, rowid - id поста."""
+
+    def add(self, post, replace=True):
+        if replace:
+            self.remove(post.pk)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, terms) VALUES (%s, %s)',
+                [post.pk, ' '.join(tokenize(post.text))])
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def add_many(self, posts):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, terms) VALUES (%s, %s)',
+                [(post.pk, ' '.join(tokenize(post.text))) for post in posts])
+
+    @staticmethod
+    def _match(terms):
+        return ' '.join(f'"{term}"' for term in terms)
+
+    def count(self, terms):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s', [self._match(terms)])
+            return cursor.fetchone()[0]
+
+    def post_ids(self, terms, offset, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY rank, rowid DESC LIMIT %s OFFSET %s',
+                [self._match(terms), limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class TermIndex:
+    """Индекс в таблице PostTerm: ранг - сколько раз встретились термины."""
+
+    def add(self, post, replace=True):
+        if replace:
+            self.remove(post.pk)
+        self.add_many([post])
+
+    def remove(self, post_id):
+        PostTerm.objects.filter(post_id=post_id).delete()
+
+    def clear(self):
+        PostTerm.objects.all().delete()
+
+    def add_many(self, posts):
+        terms = []
+        for post in posts:
+            counts = {}
+            for term in tokenize(post.text):
+                counts[term] = counts.get(term, 0) + 1
+            terms.extend(
+                PostTerm(term=term, post_id=post.pk, count=count)
+                for term, count in counts.items())
+        PostTerm.objects.bulk_create(terms)
+
+    def _matches(self, terms):
+        return PostTerm.objects.filter(term__in=terms).order_by().values(
+            'post_id').annotate(
+                matched=Count('term'), rank=Sum('count'),
+        ).filter(matched=len(terms))
+
+    def count(self, terms):
+        return self._matches(terms).count()
+
+    def post_ids(self, terms, offset, limit):
+        rows = self._matches(terms).order_by('-rank', '-post_id')
+
+        return [row['post_id'] for row in rows[offset:offset + limit]]
+
+
+def get_index():
+    """Индекс, которым пользуется текущая база."""
+    return FTS5Index() if fts5_available() else TermIndex()
+
+
+class SearchResults:
+    """Ленивая выдача поиска для Paginator: посты в порядке ранга."""
+
+    def __init__(self, query, index=None):
+        self.terms = sorted(set(tokenize(query)))
+        self.index = index or get_index()
+
+    def count(self):
+        if not self.terms:
+            return 0
+        return self.index.count(self.terms)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start = item.start or 0
+        if not self.terms or item.stop is None or item.stop <= start:
+            return []
+        ids = self.index.post_ids(self.terms, start, item.stop - start)
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+def search(query):
+    """Посты, содержащие все слова запроса, лучшие первыми."""
+    return SearchResults(query)
+
+
+def index_post(post, created=False):
+    """Добавляет пост в индекс; у нового поста нечего удалять."""
+    get_index().add(post, replace=not created)
+
+
+def unindex_post(post_id):
+    get_index().remove(post_id)
+
+
+def rebuild(batch_size=1000):
+    """Перестраивает индекс по всем постам, возвращает их число."""
+    index = get_index()
+    index.clear()
+    posts = Post.objects.order_by('pk').only('pk', 'text')
+    total, last_pk = 0, 0
+    while True:
+        batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return total
+        index.add_many(batch)
+        total += len(batch)
+        last_pk = batch[-1].pk
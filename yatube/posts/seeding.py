@@ -0,0 +1,270 @@
+"""Синтетические данные для нагрузочных тестов и бенчмарков.
+
+Генератор строит правдоподобную соцсеть, одинаковую при одном зерне:
+популярность авторов и активность читателей распределены по
+степенному закону (Ципфа), посты выходят всплесками, группы разного
+размера, комментарии собираются в обсуждения популярных постов,
+у части постов есть картинки.
+
+Объекты создаются через bulk_create пачками, поэтому сигналы не
+срабатывают; производные данные (счётчики, ленты подписок, поисковый
+индекс) пересчитываются в конце, а кэш сбрасывается по поколениям
+областей с новыми данными.
+"""
+import os
+import random
+import time
+from bisect import bisect
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
+from django.conf import settings
+from django.db import transaction
+from faker import Faker
+from PIL import Image
+
+from . import caching, counters, search, timeline
+from .constants import (SEED_BATCH_SIZE, SEED_DAYS, SEED_IMAGE_SHARE,
+                        SEED_ZIPF_ALPHA)
+from .importing import insert
+from .models import Comment, Follow, Group, Post, User
+
+USERNAME_PREFIX = 'seed_user_'
+GROUP_PREFIX = 'seed-group-'
+
+"""Дата последнего поста: от неё отсчитываются все даты, чтобы
+данные не зависели от дня запуска."""
+END_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+"""Доля постов, которые выходят всплесками, и среднее число постов
+во всплеске."""
+BURST_SHARE = 0.4
+BURST_POSTS = 200
+
+"""Средняя длительность всплеска и задержка комментария, секунд."""
+BURST_SECONDS = 60 * 60 * 3
+COMMENT_DELAY = 60 * 60 * 6
+
+"""Доля постов без группы."""
+NO_GROUP_SHARE = 0.3
+
+"""Сколько разных предложений переиспользуют тексты."""
+SENTENCES = 2000
+
+
+class Sampler:
+    """Выбор элементов с весами по закону Ципфа в случайном порядке."""
+
+    def __init__(self, rnd, values, alpha):
+        weights = [1 / rank ** alpha for rank in range(1, len(values) + 1)]
+        rnd.shuffle(weights)
+        self.rnd = rnd
+        self.values = values
+        self.cum_weights = list(accumulate(weights))
+
+    def __call__(self):
+        point = self.rnd.random() * self.cum_weights[-1]
+        return self.values[bisect(self.cum_weights, point)]
+
+
+def _batches(count, batch_size):
+    for start in range(0, count, batch_size):
+        yield range(start, min(start + batch_size, count))
+
+
+def create_users(fake, count, batch_size):
+    first_names = [fake.first_name() for _ in range(100)]
+    last_names = [fake.last_name() for _ in range(100)]
+    rnd = fake.random
+    for batch in _batches(count, batch_size):
+        User.objects.bulk_create(
+            User(username=f'{USERNAME_PREFIX}{i}', password='!',
+                 first_name=rnd.choice(first_names),
+                 last_name=rnd.choice(last_names))
+            for i in batch)
+
+    return list(User.objects.filter(
+        username__startswith=USERNAME_PREFIX).order_by('pk').values_list(
+            'id', flat=True))
+
+
+def create_groups(fake, count):
+    Group.objects.bulk_create(
+        Group(title=fake.sentence(nb_words=3)[:200],
+              slug=f'{GROUP_PREFIX}{i}',
+              description=fake.text(max_nb_chars=200))
+        for i in range(count))
+
+    return list(Group.objects.filter(
+        slug__startswith=GROUP_PREFIX).order_by('pk').values_list(
+            'id', flat=True))
+
+
+def create_images(rnd, count):
+    """Картинки разных цветов в MEDIA_ROOT, имена для ImageField."""
+    if not count:
+        return []
+    os.makedirs(os.path.join(settings.MEDIA_ROOT, 'posts'), exist_ok=True)
+    names = []
+    for i in range(count):
+        name = f'posts/seed_{i}.png'
+        color = tuple(rnd.randrange(256) for _ in range(3))
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        if not os.path.exists(path):
+            Image.new('RGB', (1200, 800), color).save(path)
+        names.append(name)
+
+    return names
+
+
+def post_dates(rnd, count, days):
+    """Отсортированные даты постов: часть равномерно, часть всплесками."""
+    span = days * 24 * 60 * 60
+    bursts = [
+        (rnd.uniform(0, span), rnd.expovariate(1 / BURST_SECONDS))
+        for _ in range(max(count // BURST_POSTS, 1))
+    ]
+    offsets = []
+    for _ in range(count):
+        if rnd.random() < BURST_SHARE:
+            start, length = rnd.choice(bursts)
+            offset = start + rnd.expovariate(1 / length)
+        else:
+            offset = rnd.uniform(0, span)
+        offsets.append(min(offset, span))
+    first = END_DATE - timedelta(seconds=span)
+
+    return [first + timedelta(seconds=offset) for offset in sorted(offsets)]
+
+
+def create_posts(rnd, sentences, count, authors, groups, images,
+                 image_share, days, batch_size):
+    """Посты в порядке дат; возвращает [(id, дата)].
+
+    id выдаются заранее под блокировкой таблицы, как при импорте: по
+    ним строятся комментарии без запросов.
+    """
+    dates = post_dates(rnd, count, days)
+    rows = []
+    for batch in _batches(count, batch_size):
+        posts = []
+        for i in batch:
+            group_id = None
+            if groups and rnd.random() >= NO_GROUP_SHARE:
+                group_id = groups()
+            image = ''
+            if images and rnd.random() < image_share:
+                image = rnd.choice(images)
+            posts.append(Post(
+                author_id=authors(),
+                group_id=group_id,
+                text=' '.join(rnd.sample(sentences, rnd.randint(1, 5))),
+                pub_date=dates[i],
+                image=image,
+            ))
+        with transaction.atomic():
+            insert(posts, 'pub_date')
+        rows += [(post.pk, post.pub_date) for post in posts]
+
+    return rows
+
+
+def create_comments(rnd, sentences, count, threads, readers, batch_size):
+    """Комментарии: у популярных постов длинные обсуждения."""
+    for batch in _batches(count, batch_size):
+        comments = []
+        for _ in batch:
+            post_id, date = threads()
+            delay = timedelta(seconds=rnd.expovariate(1 / COMMENT_DELAY))
+            comments.append(Comment(
+                post_id=post_id,
+                author_id=readers(),
+                text=rnd.choice(sentences),
+                created=min(date + delay, END_DATE),
+            ))
+        with transaction.atomic():
+            insert(comments, 'created')
+
+
+def create_follows(count, authors, readers, batch_size):
+    """Подписки активных читателей на популярных авторов."""
+    pairs = set()
+    for _ in range(count * 3):
+        if len(pairs) >= count:
+            break
+        user_id, author_id = readers(), authors()
+        if user_id != author_id:
+            pairs.add((user_id, author_id))
+    pairs = sorted(pairs)
+    for batch in _batches(len(pairs), batch_size):
+        Follow.objects.bulk_create(
+            [Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in pairs[batch.start:batch.stop]],
+            ignore_conflicts=True,
+        )
+
+
+@transaction.atomic
+def rebuild_derived():
+    """Пересчитывает счётчики, ленты подписок и поисковый индекс."""
+    counters.rebuild()
+    for author_id in Follow.objects.order_by().values_list(
+            'author_id', flat=True).distinct():
+        timeline.rebuild_author(author_id)
+    search.rebuild()
+
+
+def seed(users=100, groups=10, posts=1000, comments=1000, follows=500,
+         random_seed=0, images=0, image_share=SEED_IMAGE_SHARE,
+         alpha=SEED_ZIPF_ALPHA, days=SEED_DAYS, batch_size=SEED_BATCH_SIZE,
+         log=None):
+    """Создаёт пользователей, группы, посты, комментарии и подписки.
+
+    images - сколько разных картинок сгенерировать для постов;
+    log(этап, секунды) вызывается после каждого этапа.
+    """
+    rnd = random.Random(random_seed)
+    fake = Faker('ru_RU')
+    fake.seed_instance(random_seed)
+    started = time.perf_counter()
+
+    def done(stage):
+        nonlocal started
+        if log is not None:
+            log(stage, time.perf_counter() - started)
+        started = time.perf_counter()
+
+    user_ids = create_users(fake, users, batch_size)
+    group_ids = create_groups(fake, groups)
+    image_names = create_images(rnd, images)
+    sentences = [fake.sentence() for _ in range(SENTENCES)]
+    done('users')
+    # Популярные авторы и пишут больше, и подписчиков у них больше;
+    # активность читателей распределена независимо.
+    authors = Sampler(rnd, user_ids, alpha)
+    readers = Sampler(rnd, user_ids, alpha)
+    group_sampler = Sampler(rnd, group_ids, alpha) if group_ids else None
+    post_rows = create_posts(
+        rnd, sentences, posts, authors, group_sampler, image_names,
+        image_share, days, batch_size)
+    done('posts')
+    if post_rows:
+        create_comments(
+            rnd, sentences, comments, Sampler(rnd, post_rows, alpha),
+            readers, batch_size)
+    done('comments')
+    create_follows(follows, authors, readers, batch_size)
+    done('follows')
+    rebuild_derived()
+    # Новые посты видны на главной, в новых группах и профилях новых
+    # пользователей: сбрасываются только эти области, как при импорте.
+    caching.bump_generation(
+        'index', 'groups',
+        *(f'group_page:{slug}' for slug in Group.objects.filter(
+            slug__startswith=GROUP_PREFIX).values_list('slug', flat=True)),
+        *(f'profile_page:{username}' for username in User.objects.filter(
+            username__startswith=USERNAME_PREFIX).values_list(
+                'username', flat=True)))
+    done('derived')
+
+    return user_ids
@@ -0,0 +1,131 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, counters, metrics, search, thumbnails, timeline
+from .constants import FANOUT_LIMIT
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    """Заводим счётчики новому пользователю."""
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    """Считаем пост и раскладываем его по лентам подписчиков."""
+    if created and not raw:
+        counters.bump(instance.author_id, posts_count=1)
+        timeline.fan_out_post(instance)
+        metrics.CREATED.inc(model='post')
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump(instance.author_id, posts_count=-1)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw=False, **kwargs):
+    """Запоминаем прежние группу и картинку редактируемого поста."""
+    if instance.pk and not raw:
+        instance.previous_group_slug, instance.previous_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group__slug', 'image').first() or (None, None))
+
+
+@receiver([post_save, post_delete], sender=Post)
+def post_changed(sender, instance, **kwargs):
+    """Сбрасываем карточку поста и страницы, где он показан."""
+    caching.bump_generation(*caching.post_scopes(
+        instance, getattr(instance, 'previous_group_slug', None)))
+
+
+@receiver(post_save, sender=Post)
+def post_image_saved(sender, instance, raw=False, **kwargs):
+    """Ставим в очередь миниатюры новой картинки поста."""
+    if raw or not instance.image:
+        return
+    if instance.image.name != getattr(instance, 'previous_image', None):
+        thumbnails.schedule(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_indexed(sender, instance, created, raw=False, **kwargs):
+    """Обновляем пост в поисковом индексе."""
+    if not raw:
+        search.index_post(instance, created)
+
+
+@receiver(post_delete, sender=Post)
+def post_unindexed(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+
+
+@receiver(pre_save, sender=Group)
+def group_saving(sender, instance, raw=False, **kwargs):
+    """Запоминаем прежний slug переименуемой группы."""
+    if instance.pk and not raw:
+        instance.previous_slug = Group.objects.filter(
+            pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=Group)
+def group_changed(sender, instance, **kwargs):
+    """Сбрасываем карточки и страницы с постами группы."""
+    scopes = {
+        f'group:{instance.pk}',
+        f'group_page:{instance.slug}',
+        'index',
+        'groups',
+    }
+    previous_slug = getattr(instance, 'previous_slug', None)
+    if previous_slug:
+        scopes.add(f'group_page:{previous_slug}')
+    caching.bump_generation(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump(instance.author_id, comments_count=1)
+        metrics.CREATED.inc(model='comment')
+    caching.bump_generation(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump(instance.author_id, comments_count=-1)
+    caching.bump_generation(f'post:{instance.post_id}')
+
+
+def bump_profiles(follow):
+    """Сбрасываем профили подписчика и автора: у них сменились счётчики."""
+    caching.bump_generation(
+        f'profile_page:{follow.user.username}',
+        f'profile_page:{follow.author.username}',
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    """Считаем подписку и добавляем посты автора в ленту подписчика."""
+    if created and not raw:
+        counters.bump(instance.user_id, following_count=1)
+        counters.bump(instance.author_id, followers_count=1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        bump_profiles(instance)
+        metrics.CREATED.inc(model='follow')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """Убираем посты автора из ленты и следим за порогом fan-out."""
+    counters.bump(instance.user_id, following_count=-1)
+    counters.bump(instance.author_id, followers_count=-1)
+    timeline.drop(instance.user_id, instance.author_id)
+    bump_profiles(instance)
+    if timeline.followers_count(instance.author_id) == FANOUT_LIMIT:
+        timeline.rebuild_author(instance.author_id)
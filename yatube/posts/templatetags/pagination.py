@@ -0,0 +1,21 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_links(page_obj):
+    """Номера страниц для паджинатора: края, окно вокруг текущей
+    и многоточия на месте пропусков.
+
+    Страницы из help_paginator приходят с готовым elided_range,
+    для остальных он строится по обычному Paginator.
+    """
+    elided_range = getattr(page_obj, 'elided_range', None)
+    if elided_range is not None:
+        return elided_range
+    paginator = page_obj.paginator
+    if hasattr(paginator, 'elided_page_range'):
+        return list(paginator.elided_page_range(page_obj.number))
+
+    return list(paginator.page_range)
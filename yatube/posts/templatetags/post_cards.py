@@ -0,0 +1,21 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts import caching
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """Карточка поста из post_info.html через кэш фрагментов."""
+    request = context.get('request')
+    match = getattr(request, 'resolver_match', None)
+    view_name = match.view_name if match else ''
+
+    def render():
+        card = context.template.engine.get_template(
+            'posts/includes/post_info.html')
+        return card.render(context.new({'post': post, 'request': request}))
+
+    return mark_safe(caching.get_card(post, view_name, render))
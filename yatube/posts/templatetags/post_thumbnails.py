@@ -0,0 +1,21 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def cached_thumbnail(post, geometry):
+    """Готовая миниатюра картинки поста или None.
+
+    Если миниатюры ещё нет, её генерация ставится в очередь,
+    а шаблон показывает заглушку.
+    """
+    if not post.image:
+        return None
+    thumbnail = thumbnails.get(post.image, geometry)
+    if thumbnail is None:
+        thumbnails.schedule(post)
+
+    return thumbnail
@@ -0,0 +1,43 @@
+from contextlib import ContextDecorator
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Выполнено больше запросов, чем разрешено бюджетом."""
+
+
+class query_budget(ContextDecorator):
+    """Бюджет SQL-запросов: контекстный менеджер и декоратор.
+
+    with query_budget(5) as budget:
+        client.get(url)
+    budget.count  # сколько запросов выполнено
+    """
+
+    def __init__(self, budget, using=DEFAULT_DB_ALIAS, label=''):
+        self.budget = budget
+        self.label = label
+        self.context = CaptureQueriesContext(connections[using])
+
+    @property
+    def count(self):
+        return len(self.context)
+
+    def __enter__(self):
+        self.context.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.context.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None and self.count > self.budget:
+            queries = '\n'.join(
+                f'{number}. {query["sql"]}'
+                for number, query in enumerate(
+                    self.context.captured_queries, start=1)
+            )
+            raise QueryBudgetExceeded(
+                f'{self.label or "Блок"}: {self.count} запросов при '
+                f'бюджете {self.budget}.\n{queries}')
+        return False
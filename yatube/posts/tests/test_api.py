@@ -0,0 +1,157 @@
+import json
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.testing import capture_on_commit_callbacks
+from posts.constants import NUM_PAGE
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ApiTest(TestCase):
+    """JSON API: проекции полей, курсоры, ошибки и 304."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        for number in range(NUM_PAGE + 3):
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {number}')
+        cls.post = Post.objects.order_by('-pub_date', '-id').first()
+        for number in range(3):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Комментарий {number}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def get(self, name, client=None, status=HTTPStatus.OK, kwargs=None,
+            **params):
+        response = (client or self.client).get(
+            reverse(f'api_v1:{name}', kwargs=kwargs), params)
+        self.assertEqual(response.status_code, status)
+        return json.loads(response.content)
+
+    def walk(self, name, client=None, kwargs=None, **params):
+        """Все объекты списка, пройденного по курсорам."""
+        items, cursor = [], None
+        while True:
+            if cursor:
+                params['cursor'] = cursor
+            page = self.get(name, client, kwargs=kwargs, **params)
+            items += page['results']
+            cursor = page['next']
+            if cursor is None:
+                return items
+
+    def test_lists_walk_by_cursor(self):
+        expected = list(Post.objects.order_by(
+            '-pub_date', '-id').values_list('id', flat=True))
+        lists = {
+            'index': ({}, self.client),
+            'group_posts': ({'slug': 'group'}, self.client),
+            'profile_posts': ({'username': 'author'}, self.client),
+            'follow_feed': (None, self.reader_client),
+        }
+        for name, (kwargs, client) in lists.items():
+            with self.subTest(name=name):
+                items = self.walk(name, client, kwargs=kwargs, limit=4)
+                self.assertEqual([item['id'] for item in items], expected)
+        comments = self.walk(
+            'post_comments', kwargs={'post_id': self.post.pk}, limit=2)
+        self.assertEqual(
+            [comment['text'] for comment in comments],
+            [f'Комментарий {number}' for number in (2, 1, 0)])
+
+    def test_fields_projection(self):
+        page = self.get('index', fields='id,author', limit=1)
+        self.assertEqual(
+            page['results'], [{'id': self.post.pk, 'author': 'author'}])
+        post = self.get('post_detail', kwargs={'post_id': self.post.pk})
+        self.assertEqual(post['group'], 'group')
+        self.assertIsNone(post['image'])
+        self.assertEqual(post['text'], self.post.text)
+
+    def test_errors(self):
+        self.get('index', status=HTTPStatus.BAD_REQUEST, fields='id,secret')
+        self.get('index', status=HTTPStatus.BAD_REQUEST, limit=0)
+        self.get('index', status=HTTPStatus.BAD_REQUEST, cursor='broken')
+        self.get('group_posts', status=HTTPStatus.NOT_FOUND,
+                 kwargs={'slug': 'missing'})
+        self.get('post_detail', status=HTTPStatus.NOT_FOUND,
+                 kwargs={'post_id': 0})
+        self.get('post_comments', status=HTTPStatus.NOT_FOUND,
+                 kwargs={'post_id': 0})
+        self.get('follow_feed', status=HTTPStatus.UNAUTHORIZED)
+        response = self.client.post(reverse('api_v1:index'))
+        self.assertEqual(
+            response.status_code, HTTPStatus.METHOD_NOT_ALLOWED)
+
+    def test_lists_cost_one_query(self):
+        """Страница списка - один запрос, без моделей и шаблонов."""
+        url = reverse('api_v1:index')
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+    def test_not_modified(self):
+        url = reverse('api_v1:index')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        with capture_on_commit_callbacks(execute=True):
+            Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_profile_revalidates_after_group_rename(self):
+        """В постах профиля есть slug группы, поэтому переименование
+        группы меняет ETag профиля, как у HTML-страницы."""
+        url = reverse('api_v1:profile_posts', args=('author',))
+        etag = self.client.get(url)['ETag']
+        self.group.slug = 'renamed'
+        with capture_on_commit_callbacks(execute=True):
+            self.group.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        page = json.loads(response.content)
+        self.assertEqual(page['results'][0]['group'], 'renamed')
+
+    def test_bulk_follow(self):
+        url = reverse('api_v1:bulk_follow')
+        writer = User.objects.create_user(username='writer')
+        response = self.reader_client.post(url, json.dumps({
+            'follow': ['author', 'writer', 'nobody'],
+            'unfollow': ['reader'],
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(json.loads(response.content), {
+            'followed': ['writer'], 'unfollowed': [], 'unknown': ['nobody']})
+        writer.stats.refresh_from_db()
+        self.assertEqual(writer.stats.followers_count, 1)
+
+        response = self.reader_client.post(
+            url, json.dumps({'unfollow': ['author', 'writer']}),
+            content_type='application/json')
+        self.assertEqual(json.loads(response.content)['unfollowed'],
+                         ['author', 'writer'])
+        self.assertEqual(self.get('follow_feed', self.reader_client), {
+            'results': [], 'next': None})
+
+        for body in ('не json', '[]', '{"follow": "author"}',
+                     '{"follow": ["author"], "unfollow": ["author"]}'):
+            response = self.reader_client.post(
+                url, body, content_type='application/json')
+            self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.client.post(url, '{}', content_type='application/json')
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        response = self.reader_client.get(url)
+        self.assertEqual(
+            response.status_code, HTTPStatus.METHOD_NOT_ALLOWED)
@@ -0,0 +1,99 @@
+import random
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.test import Client, TestCase
+
+from core.testing import capture_on_commit_callbacks
+from posts import benchmark, caching, counters, seeding
+from posts.models import Comment, Follow, Post, TimelineEntry, User
+
+
+class BenchmarkTest(TestCase):
+    """Наполнение базы и прогон сценариев бенчмарка."""
+
+    def test_seed_and_run(self):
+        web = User.objects.create_user(username='web')
+        Post.objects.create(author=web, text='Пост')
+        cache.set('thumbnail:unrelated', 'чужой ключ')
+        generations = caching.get_generations('index', 'profile_page:web')
+        with capture_on_commit_callbacks(execute=True):
+            seeding.seed(
+                users=5, groups=2, posts=30, comments=10, follows=10)
+        self.assertEqual(Post.objects.count(), 31)
+        # Сбрасываются только области новых данных, а не весь кэш.
+        index, profile = caching.get_generations(
+            'index', 'profile_page:web')
+        self.assertGreater(index, generations[0])
+        self.assertEqual(profile, generations[1])
+        self.assertEqual(cache.get('thumbnail:unrelated'), 'чужой ключ')
+        # После выданных вручную id сайт продолжает последовательность.
+        last_pk = Post.objects.aggregate(last=Max('pk'))['last']
+        self.assertGreater(
+            Post.objects.create(author=web, text='Новый').pk, last_pk)
+        reader = User.objects.filter(
+            id__in=Follow.objects.values('user_id')).first()
+        client = Client()
+        client.force_login(reader)
+        report = benchmark.run(
+            client, list(benchmark.SCENARIOS), 3, random.Random(0))
+        self.assertEqual(set(report), set(benchmark.SCENARIOS))
+        for name, result in report.items():
+            with self.subTest(scenario=name):
+                self.assertEqual(result['requests'], 3)
+                self.assertNotIn('500', result['statuses'])
+                self.assertGreaterEqual(result['p99_ms'], result['p50_ms'])
+
+    def test_compare(self):
+        rows = benchmark.compare(
+            {'index': {'p50_ms': 10, 'p95_ms': 20, 'rps': 100}},
+            {'index': {'p50_ms': 5, 'p95_ms': 20, 'rps': 200},
+             'profile': {'p50_ms': 1}},
+        )
+        self.assertEqual(rows, [
+            ('index', 'p50_ms', 10, 5, -50.0),
+            ('index', 'p95_ms', 20, 20, 0.0),
+            ('index', 'rps', 100, 200, 100.0),
+        ])
+
+
+class SeedTest(TestCase):
+    """Генератор синтетических данных."""
+
+    def snapshot(self, **volumes):
+        with transaction.atomic():
+            seeding.seed(**volumes)
+            result = (
+                list(Post.objects.order_by('pk').values_list(
+                    'author__username', 'group__slug', 'text', 'pub_date')),
+                list(Comment.objects.order_by('pk').values_list(
+                    'post__text', 'author__username', 'created')),
+                sorted(Follow.objects.values_list(
+                    'user__username', 'author__username')),
+                counters.rebuild(verify=True),
+                TimelineEntry.objects.count(),
+            )
+            transaction.set_rollback(True)
+
+        return result
+
+    def test_seed_is_deterministic_and_consistent(self):
+        volumes = dict(users=30, groups=5, posts=300, comments=200,
+                       follows=100, random_seed=7)
+        posts, comments, follows, mismatches, entries = self.snapshot(
+            **volumes)
+        self.assertEqual(
+            self.snapshot(**volumes),
+            (posts, comments, follows, mismatches, entries))
+        self.assertEqual(len(posts), 300)
+        self.assertEqual(mismatches, [])
+        self.assertGreater(entries, 0)
+        dates = [pub_date for *_, pub_date in posts]
+        self.assertEqual(dates, sorted(dates))
+        (_, top_posts), = Counter(
+            author for author, *_ in posts).most_common(1)
+        self.assertGreater(top_posts, len(posts) / 30 * 3)
+        self.assertNotEqual(
+            self.snapshot(**dict(volumes, random_seed=8))[0], posts)
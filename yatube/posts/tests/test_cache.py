@@ -0,0 +1,218 @@
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from core import cache as core_cache
+from core.cache import EPOCH_KEY, FileCache, LocalLRU, TieredCache
+from posts import caching
+
+SHARED = {
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-test',
+    },
+}
+
+# Префиксы L1 из настроек сайта: тесты ниже подменяют CACHES.
+SITE_L1_PREFIXES = settings.CACHES['default']['OPTIONS']['L1_PREFIXES']
+
+
+@override_settings(CACHES=dict(SHARED, default=SHARED['shared']))
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.counter = 0
+
+    def make_cache(self, name='tiered', **options):
+        """Отдельный L1 на каждый тест: хранилища общие по имени."""
+        self.counter += 1
+        options.setdefault('L1_PREFIXES', ('post_card:',))
+        cache = TieredCache(f'{name}-{self.id()}-{self.counter}', {
+            'OPTIONS': dict({'SHARED': 'shared'}, **options)})
+        cache.clear()
+        return cache
+
+    def test_l1_serves_repeated_reads(self):
+        """Повторное чтение ключа с префиксом L1 не идёт в общий кэш."""
+        cache = self.make_cache()
+        cache.set('post_card:1', 'карточка')
+        cache.shared.set('post_card:1', 'изменено в L2')
+        self.assertEqual(cache.get('post_card:1'), 'карточка')
+        self.assertEqual(cache.stats()['l1_hit'], 1)
+
+    def test_mutable_keys_bypass_l1(self):
+        """Ключи без префикса L1 (счётчики поколений) читаются из L2."""
+        cache = self.make_cache()
+        cache.set('generation:index', 1)
+        cache.shared.incr('generation:index')
+        self.assertEqual(cache.get('generation:index'), 2)
+        self.assertEqual(cache.get_many(['generation:index', 'nope']),
+                         {'generation:index': 2})
+        self.assertEqual(cache.stats()['l1_keys'], 0)
+
+    def test_rewritten_keys_bypass_l1(self):
+        """Страницы и числа объектов перезаписываются под тем же ключом,
+        поэтому с настройками сайта другой воркер сразу видит новое
+        значение."""
+        first = self.make_cache(L1_PREFIXES=SITE_L1_PREFIXES)
+        second = self.make_cache(L1_PREFIXES=SITE_L1_PREFIXES)
+        for key in ('page:index', 'count:index'):
+            with self.subTest(key=key):
+                first.set(key, 'старое')
+                self.assertEqual(second.get(key), 'старое')
+                first.set(key, 'новое')
+                self.assertEqual(second.get(key), 'новое')
+
+    def test_other_worker_fills_l1_from_shared(self):
+        """Значение, записанное одним воркером, другой берёт из L2."""
+        first = self.make_cache()
+        second = self.make_cache()
+        first.set('post_card:1', 'карточка')
+        self.assertEqual(second.get('post_card:1'), 'карточка')
+        self.assertEqual(second.stats()['l2_hit'], 1)
+        self.assertEqual(second.get('post_card:1'), 'карточка')
+        self.assertEqual(second.stats()['l1_hit'], 1)
+
+    def test_clear_in_one_worker_resets_others(self):
+        """clear() меняет эпоху, и другие воркеры сбрасывают L1."""
+        first = self.make_cache(EPOCH_CHECK_INTERVAL=0)
+        second = self.make_cache(EPOCH_CHECK_INTERVAL=0)
+        second.set('post_card:1', 'карточка')
+        first.clear()
+        self.assertIsNotNone(first.shared.get(EPOCH_KEY))
+        self.assertIsNone(second.get('post_card:1'))
+
+    def test_lru_evicts_by_size(self):
+        """L1 держит не больше max_bytes, вытесняя давние ключи."""
+        lru = LocalLRU(max_bytes=10)
+        lru.set('a', b'aaaa', 60)
+        lru.set('b', b'bbbb', 60)
+        lru.get('a')
+        lru.set('c', b'cccc', 60)
+        lru.set('huge', b'x' * 11, 60)
+        self.assertEqual(list(lru.data), ['a', 'c'])
+        self.assertEqual(lru.size, 8)
+
+
+def run_threads(target, count):
+    """Запускает target в count потоках одновременно, ждёт их."""
+    barrier = threading.Barrier(count)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(target())
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+class FileCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = FileCache(directory.name, {})
+
+    def test_add_is_atomic(self):
+        """Из одновременных add удаётся ровно один."""
+        results = run_threads(
+            lambda: self.cache.add('lock', 1, 60), 8)
+        self.assertEqual(results.count(True), 1)
+
+    def test_incr_keeps_every_increment_and_timeout(self):
+        """Одновременные incr не теряются, ключ без срока не истекает."""
+        self.cache.set('generation', 0, None)
+        run_threads(lambda: self.cache.incr('generation'), 8)
+        self.assertEqual(self.cache.get('generation'), 8)
+        with open(self.cache._key_to_file('generation'), 'rb') as f:
+            self.assertFalse(self.cache._is_expired(f))
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_cull_keeps_max_entries(self):
+        """Каталог не растёт больше MAX_ENTRIES без подсчёта файлов
+        на каждой записи."""
+        cache = FileCache(self.cache._dir, {
+            'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2}})
+        for number in range(20):
+            cache.set(f'key{number}', number)
+            self.assertLessEqual(len(cache._list_cache_files()), 4)
+
+    def test_cull_headroom_shared_by_threads(self):
+        """Экземпляры бэкенда разных потоков делят один запас, и он
+        не больше доли MAX_ENTRIES."""
+        options = {'OPTIONS': {'MAX_ENTRIES': 40, 'CULL_FREQUENCY': 2}}
+        instances = [FileCache(self.cache._dir, options) for _ in range(8)]
+        instances[0].set('first', 0)
+        self.assertEqual(
+            core_cache._headrooms[self.cache._dir],
+            40 // FileCache.HEADROOM_DIVISOR)
+        for number in range(200):
+            instances[number % 8].set(f'key{number}', number)
+            self.assertLessEqual(len(self.cache._list_cache_files()), 40)
+
+
+@override_settings(CACHES={'default': SHARED['shared']})
+class FetchTest(SimpleTestCase):
+    """Защита страниц и карточек от лавины пересчётов."""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+    def compute(self, value='страница', pause=0):
+        def compute():
+            self.calls.append(value)
+            time.sleep(pause)
+            return value
+
+        return compute
+
+    def test_miss_is_computed_once(self):
+        """При промахе считает один запрос, остальные ждут результат."""
+        results = run_threads(lambda: caching.fetch(
+            'page:index', self.compute(pause=0.1), 60, 'page'), 8)
+        self.assertEqual(self.calls, ['страница'])
+        self.assertEqual(results, ['страница'] * 8)
+
+    def test_stale_value_served_while_recomputing(self):
+        """После срока, пока блокировку держит другой запрос,
+        отдаётся устаревшее значение."""
+        cache.set('page:index', ('старая', 0, time.time() - 1), 60)
+        cache.add(caching._lock_key('page:index'), 1, 60)
+        self.assertEqual(caching.fetch(
+            'page:index', self.compute('новая'), 60, 'page'), 'старая')
+        self.assertEqual(self.calls, [])
+        cache.delete(caching._lock_key('page:index'))
+        self.assertEqual(caching.fetch(
+            'page:index', self.compute('новая'), 60, 'page'), 'новая')
+
+    def test_probabilistic_early_expiration(self):
+        """Долгий расчёт пересчитывается заранее, быстрый - нет."""
+        cache.set('page:slow', ('старая', 1000, time.time() + 1), 60)
+        cache.set('page:fast', ('старая', 0, time.time() + 1), 60)
+        self.assertEqual(caching.fetch(
+            'page:slow', self.compute('новая'), 60, 'page'), 'новая')
+        self.assertEqual(caching.fetch(
+            'page:fast', self.compute('новая'), 60, 'page'), 'старая')
+
+    def test_uncacheable_values_not_stored(self):
+        caching.fetch('page:index', self.compute(), 60, 'page',
+                      cacheable=lambda value: False)
+        self.assertIsNone(cache.get('page:index'))
+        self.assertIsNone(cache.get(caching._lock_key('page:index')))
+
+    @override_settings(CACHE_STAMPEDE_PROTECTION=False)
+    def test_protection_can_be_disabled(self):
+        """Без защиты промах считает каждый запрос."""
+        run_threads(lambda: caching.fetch(
+            'page:index', self.compute(pause=0.1), 60, 'page'), 4)
+        self.assertEqual(len(self.calls), 4)
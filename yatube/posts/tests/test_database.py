@@ -0,0 +1,65 @@
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from yatube.db_config import databases
+
+
+class DatabaseConfigTest(SimpleTestCase):
+    def test_sqlite_defaults(self):
+        """По умолчанию - SQLite с постоянными соединениями и WAL."""
+        config, replicas = databases({}, '/srv')
+        default = config['default']
+        self.assertEqual(default['NAME'], '/srv/db.sqlite3')
+        self.assertEqual(default['CONN_MAX_AGE'], 60)
+        self.assertTrue(default['HEALTH_CHECKS'])
+        self.assertEqual(default['PRAGMAS']['journal_mode'], 'wal')
+        self.assertEqual(default['TRANSACTION_MODE'], 'IMMEDIATE')
+        self.assertEqual(replicas, [])
+
+    def test_environment_overrides(self):
+        """Подключение, реплики и тюнинг SQLite задаются окружением."""
+        config, replicas = databases({
+            'YATUBE_DB_ENGINE': 'django.db.backends.postgresql',
+            'YATUBE_DB_NAME': 'yatube',
+            'YATUBE_DB_HOST': 'primary',
+            'YATUBE_DB_CONN_MAX_AGE': '0',
+            'YATUBE_DB_HEALTH_CHECKS': '0',
+            'YATUBE_DB_REPLICAS': 'replica-a,replica-b',
+        }, '/srv')
+        self.assertEqual(replicas, ['replica_1', 'replica_2'])
+        self.assertEqual(config['replica_2']['HOST'], 'replica-b')
+        self.assertEqual(config['replica_2']['TEST'], {'MIRROR': 'default'})
+        self.assertEqual(config['default']['CONN_MAX_AGE'], 0)
+        self.assertFalse(config['default']['HEALTH_CHECKS'])
+        self.assertNotIn('PRAGMAS', config['default'])
+        config, _ = databases({'YATUBE_SQLITE_TUNING': '0'}, '/srv')
+        self.assertEqual(config['default']['PRAGMAS'], {})
+        self.assertNotIn('TRANSACTION_MODE', config['default'])
+
+    def test_sqlite_replicas_skip_write_setup(self):
+        """Реплика SQLite не переключает журнал, не берёт блокировку
+        записи в atomic и не принимает записи."""
+        config, _ = databases({'YATUBE_DB_REPLICAS': '/srv/copy.sqlite3'},
+                              '/srv')
+        replica = config['replica_1']
+        self.assertEqual(replica['NAME'], '/srv/copy.sqlite3')
+        self.assertNotIn('TRANSACTION_MODE', replica)
+        self.assertNotIn('journal_mode', replica['PRAGMAS'])
+        self.assertNotIn('synchronous', replica['PRAGMAS'])
+        self.assertEqual(replica['PRAGMAS']['query_only'], 'on')
+        self.assertEqual(
+            replica['PRAGMAS']['busy_timeout'],
+            config['default']['PRAGMAS']['busy_timeout'])
+        self.assertEqual(config['default']['PRAGMAS']['journal_mode'], 'wal')
+
+
+class SqliteConnectionTest(TestCase):
+    def test_pragmas_applied_on_connect(self):
+        """PRAGMA из настроек выполняются на соединении."""
+        pragmas = connection.settings_dict['PRAGMAS']
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], pragmas['busy_timeout'])
+            cursor.execute('PRAGMA synchronous')
+            # NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
@@ -0,0 +1,110 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from posts import counters, follows, metrics, timeline
+from posts.models import Follow, Post, TimelineEntry, User, UserStats
+from posts.tests.query_budget import query_budget
+
+AUTHORS = 200
+
+
+class BulkFollowsTest(TestCase):
+    """Массовые подписки: счётчики и ленты как при подписке по одной."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = User.objects.bulk_create([
+            User(username=f'author{number}') for number in range(AUTHORS)])
+        cls.authors = list(User.objects.filter(username__startswith='author'))
+        Post.objects.bulk_create([
+            Post(author=author, text=f'Пост {author.username}')
+            for author in cls.authors])
+        UserStats.objects.all().delete()
+        UserStats.objects.bulk_create([
+            UserStats(user_id=user_id, **counts)
+            for user_id, counts in counters.recount().items()])
+
+    def pairs(self, authors):
+        return {(self.reader.pk, author.pk) for author in authors}
+
+    def assert_consistent(self):
+        """Счётчики совпадают с пересчётом, лента - с подписками."""
+        stats = {
+            stats.pop('user_id'): stats
+            for stats in UserStats.objects.values(
+                'user_id', 'posts_count', 'comments_count',
+                'followers_count', 'following_count')}
+        self.assertEqual(stats, counters.recount())
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(user=self.reader).values_list(
+                'post_id', flat=True)),
+            set(Post.objects.filter(
+                author__following__user=self.reader).values_list(
+                    'id', flat=True)))
+
+    def test_add_and_remove_in_constant_queries(self):
+        """Сотни подписок - десяток запросов, а не сотни."""
+        with query_budget(12):
+            added = follows.add(
+                self.pairs(self.authors) | {(self.reader.pk, self.reader.pk)})
+        self.assertEqual(added, self.pairs(self.authors))
+        self.assert_consistent()
+        self.assertEqual(follows.add(self.pairs(self.authors[:5])), set())
+
+        with query_budget(12):
+            removed = follows.remove(self.pairs(self.authors[:150]))
+        self.assertEqual(len(removed), 150)
+        self.assert_consistent()
+
+    def test_concurrent_add_keeps_counters(self):
+        """Пары, которые параллельный импорт записал, пока вызов ждал
+        блокировку, не считаются созданными и не увеличивают счётчики
+        второй раз."""
+        pairs = self.pairs(self.authors[:3])
+        concurrent = set(list(pairs)[:2])
+        lock_table = follows.lock_table
+
+        def concurrent_import(model):
+            Follow.objects.bulk_create(
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id, author_id in concurrent)
+            follows.after_add(concurrent)
+            lock_table(model)
+
+        created = metrics.CREATED.get(model='follow')
+        with mock.patch('posts.follows.lock_table',
+                        side_effect=concurrent_import):
+            added = follows.add(pairs)
+        self.assertEqual(added, pairs - concurrent)
+        self.assertEqual(metrics.CREATED.get(model='follow'), created + 1)
+        self.assert_consistent()
+
+    def test_sync_replaces_graph(self):
+        follows.add(self.pairs(self.authors[:10]))
+        added, removed = follows.sync(
+            {self.reader.pk: {author.pk for author in self.authors[5:15]}},
+            replace=True)
+        self.assertEqual(added, self.pairs(self.authors[10:15]))
+        self.assertEqual(removed, self.pairs(self.authors[:5]))
+        self.assertEqual(
+            set(Follow.objects.values_list('user_id', 'author_id')),
+            self.pairs(self.authors[5:15]))
+        self.assert_consistent()
+
+    def test_popular_authors_not_backfilled(self):
+        """Посты популярных авторов в ленты не раскладываются, а после
+        отписки ниже порога ленты пересобираются."""
+        author = self.authors[0]
+        with mock.patch('posts.follows.FANOUT_LIMIT', 0), \
+                mock.patch('posts.timeline.FANOUT_LIMIT', 0):
+            follows.add(self.pairs(self.authors[:1]))
+            self.assertFalse(TimelineEntry.objects.exists())
+            fan = User.objects.create_user(username='fan')
+            follows.add({(fan.pk, author.pk)})
+        with mock.patch('posts.follows.FANOUT_LIMIT', 1), \
+                mock.patch('posts.timeline.FANOUT_LIMIT', 1):
+            follows.remove({(fan.pk, author.pk)})
+            self.assertTrue(timeline.is_fanned_out(author))
+        self.assert_consistent()
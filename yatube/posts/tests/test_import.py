@@ -0,0 +1,139 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import search, timeline
+from posts.models import Comment, Follow, Group, Post, User
+
+TEMP_DIR = tempfile.mkdtemp()
+
+
+class ImportPostsTest(TestCase):
+    """Команда import_posts и обновление производных данных."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def write(self, name, lines, compress=False):
+        path = os.path.join(TEMP_DIR, name)
+        data = '\n'.join(lines) + '\n'
+        if compress:
+            with gzip.open(path, 'wt', encoding='utf-8') as input_file:
+                input_file.write(data)
+        else:
+            with open(path, 'w', encoding='utf-8') as input_file:
+                input_file.write(data)
+
+        return path
+
+    def call(self, *args):
+        stderr = StringIO()
+        call_command('import_posts', *args, stdout=StringIO(), stderr=stderr)
+
+        return stderr.getvalue()
+
+    def test_import_posts(self):
+        path = self.write('posts.ndjson', [
+            json.dumps({'text': 'Импортированные новости', 'author': 'author',
+                        'group': 'group', 'pub_date': '2020-01-02T03:04:05'}),
+            json.dumps({'text': 'Второй пост', 'author_id': self.author.pk}),
+            json.dumps({'text': 'Чужой пост', 'author': 'nobody'}),
+            'не json',
+        ])
+        errors = self.call(path, '--batch-size', '1')
+        self.assertIn('строка 3: нет пользователя', errors)
+        self.assertIn('строка 4: строка не разбирается', errors)
+        post = Post.objects.get(text='Импортированные новости')
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(
+            post.pub_date, datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, 2)
+        self.assertEqual(timeline.feed(self.reader).count(), 2)
+        self.assertEqual(list(search.search('новость')[:10]), [post])
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertGreater(new_post.pk, post.pk)
+
+    def test_dates_kept(self):
+        """Дата из файла пишется как есть, без даты - текущее время."""
+        path = self.write('dated.ndjson', [
+            json.dumps({'text': 'Старый пост', 'author': 'author',
+                        'pub_date': '2019-01-01T00:00:00+00:00'}),
+            json.dumps({'text': 'Без даты', 'author': 'author'}),
+        ])
+        before = datetime.now(timezone.utc)
+        self.call(path)
+        self.assertEqual(
+            Post.objects.get(text='Старый пост').pub_date.year, 2019)
+        self.assertGreaterEqual(
+            Post.objects.get(text='Без даты').pub_date, before)
+
+    def test_import_comments_and_follows(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        path = self.write('comments.csv.gz', [
+            'post_id,author,text,created',
+            f'{post.pk},reader,Комментарий,2021-05-06T07:08:09+00:00',
+            '999999,reader,Пропавший пост,',
+        ], compress=True)
+        errors = self.call(path, '--table', 'comments')
+        self.assertIn('строка 3: нет поста с id 999999', errors)
+        comment = Comment.objects.get()
+        self.assertEqual(comment.created.year, 2021)
+        self.reader.stats.refresh_from_db()
+        self.assertEqual(self.reader.stats.comments_count, 1)
+
+        path = self.write('follows.ndjson', [
+            json.dumps({'user': 'author', 'author': 'reader'}),
+            json.dumps({'user': 'author', 'author': 'reader'}),
+            json.dumps({'user': 'reader', 'author': 'author'}),
+            json.dumps({'user': 'reader', 'author': 'reader'}),
+        ])
+        stderr = StringIO()
+        call_command('import_follows', path, stdout=StringIO(), stderr=stderr)
+        self.assertIn(
+            'строка 4: нельзя подписаться на себя', stderr.getvalue())
+        self.assertEqual(Follow.objects.count(), 2)
+        self.reader.stats.refresh_from_db()
+        self.assertEqual(self.reader.stats.followers_count, 1)
+        self.assertEqual(self.reader.stats.following_count, 1)
+
+    def test_import_follows_replace(self):
+        """import_follows --replace приводит подписки к графу из файла."""
+        writer = User.objects.create_user(username='writer')
+        path = self.write('graph.csv', [
+            'user,author',
+            'reader,writer',
+            'writer,author',
+            'writer,writer',
+            'reader,nobody',
+        ])
+        stderr = StringIO()
+        call_command('import_follows', path, '--replace', '--batch-size', '1',
+                     stdout=StringIO(), stderr=stderr)
+        errors = stderr.getvalue()
+        self.assertIn('строка 4: нельзя подписаться на себя', errors)
+        self.assertIn("строка 5: нет пользователя 'nobody'", errors)
+        self.assertEqual(
+            set(Follow.objects.values_list('user', 'author')),
+            {(self.reader.pk, writer.pk), (writer.pk, self.author.pk)})
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.assertFalse(timeline.feed(self.reader).exists())
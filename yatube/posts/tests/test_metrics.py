@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics as core_metrics
+from posts import metrics
+from posts.models import Comment, Follow, Post
+
+User = get_user_model()
+
+
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_requests_cache_and_created_objects(self):
+        """Длительность запросов по view, обращения к кэшу страниц
+        и созданные объекты попадают в метрики."""
+        before = {
+            model: metrics.CREATED.get(model=model)
+            for model in ('post', 'comment', 'follow')
+        }
+        requests = core_metrics.REQUEST_SECONDS.get_count(
+            view='posts:home', method='GET')
+        page_misses = metrics.CACHE_REQUESTS.get(cache='page', result='miss')
+        page_hits = metrics.CACHE_REQUESTS.get(cache='page', result='hit')
+        Client().get(reverse('posts:home'))
+        Client().get(reverse('posts:home'))
+        Post.objects.create(author=self.author, text='Ещё пост')
+        Comment.objects.create(post=self.post, author=self.reader, text='К')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(core_metrics.REQUEST_SECONDS.get_count(
+            view='posts:home', method='GET'), requests + 2)
+        self.assertEqual(metrics.CACHE_REQUESTS.get(
+            cache='page', result='miss'), page_misses + 1)
+        self.assertEqual(metrics.CACHE_REQUESTS.get(
+            cache='page', result='hit'), page_hits + 1)
+        for model, count in before.items():
+            with self.subTest(model=model):
+                self.assertEqual(metrics.CREATED.get(model=model), count + 1)
+
+    def test_metrics_endpoint(self):
+        """Метрики отдаются в формате Prometheus сотрудникам и адресам
+        из METRICS_ALLOWED_IPS, по умолчанию - никаким."""
+        Client().get(reverse('posts:home'))
+        self.assertEqual(Client().get(reverse('metrics')).status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=('127.0.0.1',)):
+            response = Client().get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        text = response.content.decode()
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram', text)
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:home",method="GET",le="+Inf"}', text)
+        self.assertIn('yatube_cache_requests_total{cache="page"', text)
+        outside = Client(REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(outside.get(reverse('metrics')).status_code, 403)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        outside.force_login(staff)
+        self.assertEqual(outside.get(reverse('metrics')).status_code, 200)
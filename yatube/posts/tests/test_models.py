@@ -1,7 +1,13 @@
+import json
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, UserStats
 from ..constants import POST_NUM
 
 User = get_user_model()
@@ -49,3 +55,80 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).verbose_name, expected_value)
+
+
+class UserStatsTest(TestCase):
+    """Тестируем денормализованные счётчики пользователя."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+
+    def get_stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        author_stats = self.get_stats(self.author)
+        reader_stats = self.get_stats(self.reader)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(reader_stats.following_count, 1)
+        self.assertEqual(reader_stats.comments_count, 1)
+        follow.delete()
+        comment.delete()
+        post.delete()
+        for stats in (self.get_stats(self.author),
+                      self.get_stats(self.reader)):
+            with self.subTest(user=stats.user_id):
+                self.assertEqual(
+                    (stats.posts_count, stats.followers_count,
+                     stats.following_count, stats.comments_count),
+                    (0, 0, 0, 0))
+
+    def test_rebuild_stats_command(self):
+        """Команда rebuild_stats находит и чинит расхождения."""
+        Post.objects.create(text='Пост', author=self.author)
+        Post.objects.create(text='Пост', author=self.author)
+        UserStats.objects.filter(user=self.author).update(posts_count=5)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_stats', '--verify', stdout=StringIO())
+        call_command('rebuild_stats', stdout=StringIO())
+        self.assertEqual(self.get_stats(self.author).posts_count, 2)
+        call_command('rebuild_stats', '--verify', stdout=StringIO())
+
+
+class HotQueryIndexTest(TestCase):
+    """Тестируем ограничения и индексы горячих запросов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='TestGroupTitle',
+            slug='TestSlug',
+            description='TestDescription',
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group)
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def test_follow_is_unique(self):
+        """Повторная подписка на автора запрещена в базе."""
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=self.user, author=self.author)
+
+    def test_query_plans_command(self):
+        """Команда query_plans отчитывается по всем горячим запросам."""
+        out = StringIO()
+        call_command('query_plans', '--runs', '2', '--json', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report), {
+            'index', 'group_posts', 'profile', 'comments', 'follow_probe'})
+        self.assertIn('post_author_pub_date_idx', report['profile']['plan'])
@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.test import Client, TestCase, override_settings
+from django.template.base import Template
+from django.urls import reverse
+
+from core import profiling
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_LOG_INTERVAL=3600)
+class ProfilingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        profiling.registry.reset()
+        # Обёртки ставит middleware; другим тестам они не нужны.
+        self.addCleanup(profiling.uninstall)
+
+    def test_requests_aggregated_by_view(self):
+        """Замеры копятся по имени view: SQL, шаблоны и кэш."""
+        client = Client()
+        client.get(reverse('posts:home'))
+        client.get(reverse('posts:home'))
+        client.get(reverse('posts:profile', args=('author',)))
+        report = dict(profiling.registry.report())
+        home = report['posts:home']
+        self.assertEqual(home['requests'], 2)
+        self.assertGreater(home['sql_queries'], 0)
+        self.assertGreater(home['template_ms'], 0)
+        self.assertGreater(home['cache_hits'], 0)
+        self.assertGreater(home['cache_misses'], 0)
+        self.assertEqual(report['posts:profile']['requests'], 1)
+
+    def test_report_dumped_to_log(self):
+        """Сводка периодически пишется в лог."""
+        with self.settings(PROFILING_LOG_INTERVAL=0), self.assertLogs(
+                'core.profiling', 'INFO') as logs:
+            Client().get(reverse('posts:home'))
+        self.assertIn('posts:home requests=1', logs.output[0])
+
+    def test_disabled_by_default(self):
+        """Без PROFILING_SAMPLE_RATE запросы не замеряются."""
+        with self.settings(PROFILING_SAMPLE_RATE=0):
+            Client().get(reverse('posts:home'))
+        self.assertEqual(profiling.registry.report(), [])
+        self.assertFalse(getattr(Template.render, 'profiled', False))
+
+    def test_uninstall_restores_methods(self):
+        """uninstall() возвращает методы шаблонов и кэша как были."""
+        backend = type(caches['default'])
+        render, get, get_many = (
+            Template.render, backend.get, backend.get_many)
+        Client().get(reverse('posts:home'))
+        self.assertTrue(Template.render.profiled)
+        self.assertTrue(backend.get.profiled)
+        profiling.uninstall()
+        self.assertIs(Template.render, render)
+        self.assertIs(backend.get, get)
+        self.assertIs(backend.get_many, get_many)
+
+    def test_report_page_for_staff_only(self):
+        """Сводку видят только сотрудники; POST её сбрасывает."""
+        url = reverse('profiling')
+        client = Client()
+        client.force_login(self.author)
+        self.assertRedirects(
+            client.get(url), f'/admin/login/?next={url}',
+            fetch_redirect_response=False)
+        client.force_login(self.staff)
+        client.get(reverse('posts:home'))
+        response = client.get(url)
+        self.assertContains(response, 'posts:home')
+        client.post(url)
+        self.assertNotIn(
+            'posts:home', dict(profiling.registry.report()))
@@ -0,0 +1,112 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.constants import COMMENTS_NUM, NUM_PAGE
+from posts.models import Comment, Follow, Group, Post
+from posts.urls import app_name, urlpatterns
+
+from .query_budget import query_budget
+
+User = get_user_model()
+
+"""Объёмы данных: запросов на большом не должно быть больше,
+чем на малом."""
+DATA_SIZES = (1, NUM_PAGE * 3, COMMENTS_NUM * 2)
+
+"""Бюджет запросов для каждого маршрута posts/urls.py:
+имя url, метод, аргументы url, данные формы, бюджет."""
+URL_BUDGETS = (
+    ('posts:home', 'get', {}, None, 5),
+    ('posts:group', 'get', {'slug': 'group'}, None, 5),
+    ('posts:profile', 'get', {'username': 'author'}, None, 6),
+    ('posts:post_detail', 'get', {'post_id': 'post'}, None, 6),
+    ('posts:follow_index', 'get', {}, None, 5),
+    ('posts:post_create', 'get', {}, None, 5),
+    ('posts:search', 'get', {}, {'q': 'Пост'}, 5),
+    ('posts:export', 'get', {'table': 'posts'}, None, 2),
+    ('posts:post_create', 'post', {}, {'text': 'Новый пост'}, 10),
+    ('posts:post_edit', 'get', {'post_id': 'post'}, None, 5),
+    ('posts:post_edit', 'post', {'post_id': 'post'},
+     {'text': 'Изменённый пост'}, 8),
+    ('posts:add_comment', 'post', {'post_id': 'post'},
+     {'text': 'Комментарий'}, 7),
+    ('posts:profile_follow', 'get', {'username': 'newcomer'}, None, 12),
+    ('posts:profile_unfollow', 'get', {'username': 'stranger'}, None, 13),
+)
+
+
+class QueryBudgetTest(TestCase):
+    """Число запросов каждого маршрута не растёт с объёмом данных."""
+
+    def seed(self, size):
+        """Пользователи, посты, комментарии и подписки объёма size."""
+        self.author = User.objects.create_user(username='author')
+        self.stranger = User.objects.create_user(username='stranger')
+        self.newcomer = User.objects.create_user(username='newcomer')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        readers = [
+            User.objects.create_user(username=f'reader_{i}')
+            for i in range(size)
+        ]
+        for reader in [self.reader] + readers:
+            Follow.objects.create(user=reader, author=self.author)
+        Follow.objects.create(user=self.author, author=self.stranger)
+        for i in range(size):
+            Post.objects.create(
+                author=self.author, group=self.group, text=f'Пост {i}')
+            Post.objects.create(author=self.stranger, text=f'Чужой пост {i}')
+            Post.objects.create(author=self.newcomer, text=f'Новый пост {i}')
+        self.post = Post.objects.filter(author=self.author).first()
+        for reader in readers:
+            Comment.objects.create(
+                post=self.post, author=reader, text='Комментарий')
+
+    def resolve(self, kwargs):
+        """Подставляет в аргументы url объекты из seed."""
+        values = {
+            'group': self.group.slug,
+            'author': self.author.username,
+            'stranger': self.stranger.username,
+            'newcomer': self.newcomer.username,
+            'post': self.post.pk,
+        }
+        return {
+            name: values.get(value, value) for name, value in kwargs.items()
+        }
+
+    def measure(self, size):
+        """Запросы каждого маршрута при объёме данных size."""
+        counts = {}
+        for name, method, kwargs, data, budget in URL_BUDGETS:
+            with transaction.atomic():
+                self.seed(size)
+                client = Client()
+                client.force_login(self.author)
+                url = reverse(name, kwargs=self.resolve(kwargs))
+                cache.clear()
+                label = f'{method.upper()} {name} (size={size})'
+                with query_budget(budget, label=label) as spent:
+                    getattr(client, method)(url, data or {})
+                counts[(name, method)] = spent.count
+                transaction.set_rollback(True)
+
+        return counts
+
+    def test_every_route_has_budget(self):
+        """Новый маршрут posts/urls.py нельзя добавить без бюджета."""
+        self.assertEqual(
+            {f'{app_name}:{pattern.name}' for pattern in urlpatterns},
+            {name for name, *_ in URL_BUDGETS},
+        )
+
+    def test_queries_within_budget_and_constant(self):
+        small, *larger = [self.measure(size) for size in DATA_SIZES]
+        for counts in larger:
+            for route, count in counts.items():
+                with self.subTest(route=route):
+                    self.assertLessEqual(count, small[route])
@@ -0,0 +1,114 @@
+from http import HTTPStatus
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import replicas
+from core.testing import capture_on_commit_callbacks
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaRouterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.router = replicas.ReplicaRouter()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def test_reads_outside_marked_views_use_primary(self):
+        """Без разметки view чтения идут в основную базу."""
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertFalse(self.router.allow_migrate('replica_1', 'posts'))
+
+    def test_marked_views_read_from_replica(self):
+        """Страницы без общего кэша читают из реплики, запись
+        переключает пользователя на основную базу."""
+        with mock.patch('core.replicas.choose_replica',
+                        return_value='default') as choose:
+            for url in (
+                reverse('posts:post_detail', args=(self.post.pk,)),
+                reverse('posts:follow_index'),
+            ):
+                with self.subTest(url=url):
+                    choose.reset_mock()
+                    self.client.get(url)
+                    self.assertTrue(choose.called)
+            response = self.client.post(
+                reverse('posts:post_create'), {'text': 'Новый пост'})
+            self.assertIn(replicas.STICKY_COOKIE, response.cookies)
+            choose.reset_mock()
+            self.client.get(reverse('posts:post_detail', args=(self.post.pk,)))
+            self.assertFalse(choose.called)
+
+    def test_cached_pages_not_filled_from_replica(self):
+        """Страница, которая кладётся в кэш под новым поколением, не
+        читается из отстающей реплики, и ответ из реплики не получает
+        ETag: иначе устаревшую страницу получали бы все до конца TTL."""
+        reader = Client()
+        with mock.patch('core.replicas.choose_replica',
+                        return_value='default') as stale_replica:
+            reader.get(reverse('posts:home'))
+            with capture_on_commit_callbacks(execute=True):
+                post = Post.objects.create(author=self.author, text='Свежий')
+            for url in (
+                reverse('posts:home'),
+                reverse('posts:group', args=('group',)),
+                reverse('posts:profile', args=('author',)),
+            ):
+                with self.subTest(url=url):
+                    response = reader.get(url)
+                    self.assertIn('ETag', response)
+            self.assertFalse(stale_replica.called)
+            self.assertContains(reader.get(reverse('posts:home')), 'Свежий')
+            response = reader.get(
+                reverse('posts:post_detail', args=(post.pk,)))
+            self.assertTrue(stale_replica.called)
+            self.assertNotIn('ETag', response)
+
+    def test_logged_in_users_get_validators(self):
+        """Пользователь и сессия читаются из основной базы, поэтому
+        вошедший пользователь тоже получает ETag и 304 на страницах,
+        которые собираются по основной базе."""
+        with mock.patch('core.replicas.choose_replica',
+                        return_value='default') as choose:
+            for url in (
+                reverse('posts:home'),
+                reverse('posts:group', args=('group',)),
+                reverse('posts:profile', args=('author',)),
+            ):
+                with self.subTest(url=url):
+                    response = self.client.get(url)
+                    self.assertIn('ETag', response)
+                    self.assertIn('private', response['Cache-Control'])
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                    self.assertEqual(
+                        response.status_code, HTTPStatus.NOT_MODIFIED)
+            self.assertFalse(choose.called)
+
+    def test_write_inside_marked_view_pins_primary(self):
+        """После записи в том же запросе чтения идут в основную базу."""
+        state = replicas.RequestState()
+        token = replicas._state.set(state)
+        try:
+            state.replica_allowed = True
+            self.assertEqual(self.router.db_for_read(Post), 'replica_1')
+            self.router.db_for_write(Post)
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+        finally:
+            replicas._state.reset(token)
@@ -1,5 +1,12 @@
+import csv
+import gzip
+import json
+import os
 import shutil
 import tempfile
+from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.test import TestCase, Client, override_settings
@@ -8,9 +15,15 @@ from django import forms
 from django.core.cache import cache
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import transaction
 
-from posts.models import Post, Group, Comment, Follow
-from posts.constants import NUM_PAGE, TEST_PAGE_2
+from core.testing import capture_on_commit_callbacks
+from posts.models import Post, Group, Comment, Follow, TimelineEntry
+from posts import caching, search, thumbnails
+from posts.constants import (COMMENTS_NUM, ESTIMATE_MIN_ROWS, NUM_PAGE,
+                             TEST_PAGE_2)
+from posts.utils import CachedCountPaginator
 
 
 User = get_user_model()
@@ -69,6 +82,7 @@ class TestPostViews(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(username='test_user')
         self.authorized_client = Client()
         self.author_client = Client()
@@ -151,6 +165,26 @@ class TestPostViews(TestCase):
         self.assertEqual(comments.post, self.comment.post)
         self.assertEqual(comments.id, self.comment.id)
 
+    def test_post_detail_queries_do_not_grow(self):
+        """ post_detail делает одно и то же число запросов при любом
+        числе комментариев, а лишние комментарии уходят на страницы. """
+        url = reverse(self.P_POST_DETAIL, kwargs={'post_id': self.post.pk})
+        self.authorized_client.get(url)
+        with self.assertNumQueries(6):
+            self.authorized_client.get(url)
+        authors = [
+            User.objects.create_user(username=f'commentator_{i}')
+            for i in range(COMMENTS_NUM + 5)
+        ]
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=author, text='Комментарий')
+            for author in authors
+        ])
+        with self.assertNumQueries(6):
+            response = self.authorized_client.get(url)
+        self.assertEqual(len(response.context['comments']), COMMENTS_NUM)
+        self.assertTrue(response.context['comments'].has_next())
+
     def test_create_context(self):
         """Шаблон post_create с правильным контекстом."""
         response = self.authorized_client.get(reverse(self.P_CREATE))
@@ -242,31 +276,289 @@ class TestPostViews(TestCase):
                 self.assertEqual(len(response.context['page_obj'].object_list),
                                  TEST_PAGE_2)
 
-    def test_index_page_used_cache(self):
-        """ Тестируем использование кэша на главной странице. """
-        cache.clear()
-        item_bef_post = self.authorized_client.get(
-            reverse(self.P_HOME)).content
-        cache.clear()
-        new_post = Post.objects.create(
-            text='Тестируем кеш',
-            author=self.user,
-            group=self.group,
-        )
-        item_with_post = self.authorized_client.get(
-            reverse(self.P_HOME)).content
-        new_post.delete()
-        item_with_cached_post = self.authorized_client.get(
-            reverse(self.P_HOME)).content
+    def test_paginator_count_cached_per_scope(self):
+        """ Число постов берётся из кэша области и сбрасывается
+        сигналами. """
+        Post.objects.bulk_create([
+            Post(author=self.author, text=f'Пост {i}', group=self.group)
+            for i in range(NUM_PAGE * 10)
+        ])
+        url = reverse(self.P_GROUP, kwargs={'slug': self.group.slug})
+        page_obj = self.client.get(url + '?page=5').context['page_obj']
+        self.assertEqual(page_obj.paginator.count, NUM_PAGE * 10 + 1)
+        Post.objects.filter(pk=self.post.pk).update(text='Мимо сигналов')
+        with self.assertNumQueries(0):
+            paginator = CachedCountPaginator(
+                Post.objects.filter(group=self.group), NUM_PAGE,
+                count_scopes=(f'group_page:{self.group.slug}',))
+            self.assertEqual(paginator.count, NUM_PAGE * 10 + 1)
+        with capture_on_commit_callbacks(execute=True):
+            Post.objects.create(
+                author=self.author, text='Ещё', group=self.group)
+        paginator = CachedCountPaginator(
+            Post.objects.filter(group=self.group), NUM_PAGE,
+            count_scopes=(f'group_page:{self.group.slug}',))
+        self.assertEqual(paginator.count, NUM_PAGE * 10 + 2)
+
+    def test_paginator_elides_page_links(self):
+        """ Ссылок на страницы не больше окна и краёв при любом
+        числе страниц. """
+        paginator = CachedCountPaginator(range(NUM_PAGE * 100), NUM_PAGE)
+        self.assertEqual(
+            list(paginator.elided_page_range(50)),
+            [1, '…', 48, 49, 50, 51, 52, '…', 100])
+        self.assertEqual(
+            list(paginator.elided_page_range(3)),
+            [1, 2, 3, 4, 5, '…', 100])
+        Post.objects.bulk_create([
+            Post(author=self.author, text=f'Пост {i}')
+            for i in range(NUM_PAGE * 30)
+        ])
+        response = self.client.get(reverse(self.P_HOME) + '?page=15')
+        self.assertEqual(
+            response.context['page_obj'].elided_range,
+            [1, '…', 13, 14, 15, 16, 17, '…', 31])
+        self.assertContains(response, 'class="page-link">…</span>', 2)
+        self.assertNotContains(response, '?page=2"')
+
+    def test_paginator_uses_estimate_for_huge_tables(self):
+        """ Для огромной таблицы берётся оценка планировщика. """
+        paginator = CachedCountPaginator(
+            Post.objects.all(), NUM_PAGE, count_scopes=('index',),
+            estimate=True)
+        with mock.patch('posts.utils.estimated_count',
+                        return_value=ESTIMATE_MIN_ROWS):
+            self.assertEqual(paginator.count, ESTIMATE_MIN_ROWS)
         cache.clear()
-        content_post_deleted_cash_cleared = self.authorized_client.get(
-            reverse(self.P_HOME)).content
-        self.assertEqual(item_bef_post,
-                         content_post_deleted_cash_cleared)
+        paginator = CachedCountPaginator(
+            Post.objects.all(), NUM_PAGE, count_scopes=('index',),
+            estimate=True)
+        with mock.patch('posts.utils.estimated_count', return_value=5):
+            self.assertEqual(paginator.count, 1)
+
+    def test_follow_feed_count_follows_authors(self):
+        """ Число постов ленты сбрасывается новым постом автора. """
+        Follow.objects.create(user=self.follower_us, author=self.author)
+        url = reverse(self.P_FOLLOW_INDEX)
+        self.assertEqual(
+            self.follower.get(url).context['page_obj'].paginator.count, 1)
+        with capture_on_commit_callbacks(execute=True):
+            Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(
+            self.follower.get(url).context['page_obj'].paginator.count, 2)
+
+    def test_index_page_used_cache(self):
+        """ Главная страница берётся из кэша, пока посты не менялись,
+        и сразу сбрасывается при создании и удалении поста. """
+        url = reverse(self.P_HOME)
+        item_bef_post = self.authorized_client.get(url).content
+        with capture_on_commit_callbacks(execute=True):
+            new_post = Post.objects.create(
+                text='Тестируем кеш',
+                author=self.user,
+                group=self.group,
+            )
+        item_with_post = self.authorized_client.get(url).content
+        self.assertNotEqual(item_bef_post, item_with_post)
+        Post.objects.filter(pk=new_post.pk).update(text='Мимо сигналов')
+        item_with_cached_post = self.authorized_client.get(url).content
         self.assertEqual(item_with_post, item_with_cached_post)
-        self.assertNotEqual(item_with_post,
-                            content_post_deleted_cash_cleared)
-        self.assertNotEqual(item_bef_post, item_with_cached_post)
+        with capture_on_commit_callbacks(execute=True):
+            new_post.delete()
+        content_post_deleted = self.authorized_client.get(url).content
+        self.assertEqual(item_bef_post, content_post_deleted)
+
+    def test_generation_bumped_on_commit(self):
+        """ Поколение области меняется только после фиксации записи,
+        а при откате остаётся прежним. """
+        scope = f'post:{self.post.pk}'
+        generation = caching.get_generations(scope)
+        with capture_on_commit_callbacks(execute=True):
+            with transaction.atomic():
+                Comment.objects.create(
+                    post=self.post, author=self.user, text='Откат')
+                transaction.set_rollback(True)
+        self.assertEqual(caching.get_generations(scope), generation)
+        with capture_on_commit_callbacks(execute=True):
+            Comment.objects.create(
+                post=self.post, author=self.user, text='Фиксация')
+            self.assertEqual(caching.get_generations(scope), generation)
+        self.assertGreater(caching.get_generations(scope), generation)
+
+    def test_conditional_get(self):
+        """ Повторный запрос с валидаторами получает 304, пока данные
+        страницы не менялись; у каждого пользователя свой ETag. """
+        urls = [
+            reverse(self.P_HOME),
+            reverse(self.P_GROUP, kwargs={'slug': self.group.slug}),
+            reverse(self.P_PROFILE,
+                    kwargs={'username': self.author.username}),
+            reverse(self.P_POST_DETAIL, kwargs={'post_id': self.post.pk}),
+        ]
+        etags = {}
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                etags[url] = response['ETag']
+                self.assertIn('no-cache', response['Cache-Control'])
+                self.assertIn('private', response['Cache-Control'])
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED)
+                response = self.authorized_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED)
+                self.assertNotEqual(
+                    self.author_client.get(url)['ETag'], etags[url])
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.user, text='В обход')])
+        self.assertContains(self.authorized_client.get(
+            urls[-1], HTTP_IF_NONE_MATCH=etags[urls[-1]]), 'В обход')
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Изменённый текст'
+        with capture_on_commit_callbacks(execute=True):
+            post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertContains(response, 'Изменённый текст')
+
+    def test_group_page_cache_follows_post_group(self):
+        """ Перенос поста в другую группу сбрасывает обе страницы групп. """
+        other_group = Group.objects.create(
+            title='Другая группа', slug='other', description='Описание')
+        old_url = reverse(self.P_GROUP, kwargs={'slug': self.group.slug})
+        new_url = reverse(self.P_GROUP, kwargs={'slug': other_group.slug})
+        self.assertContains(self.client.get(old_url), self.post.text)
+        self.assertNotContains(self.client.get(new_url), self.post.text)
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = other_group
+        with capture_on_commit_callbacks(execute=True):
+            post.save()
+        self.assertNotContains(self.client.get(old_url), self.post.text)
+        self.assertContains(self.client.get(new_url), self.post.text)
+
+    def test_post_card_fragment_cache(self):
+        """ Карточка поста берётся из кэша до сохранения поста или группы. """
+        cache.clear()
+        url = reverse(self.P_PROFILE,
+                      kwargs={'username': self.author.username})
+        self.client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+        self.assertNotContains(self.client.get(url), 'Новый текст')
+        with capture_on_commit_callbacks(execute=True):
+            Post.objects.get(pk=self.post.pk).save()
+        self.assertContains(self.client.get(url), 'Новый текст')
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed_slug'
+        with capture_on_commit_callbacks(execute=True):
+            group.save()
+        self.assertContains(
+            self.client.get(url),
+            reverse(self.P_GROUP, kwargs={'slug': 'renamed_slug'}))
+
+    def test_thumbnail_placeholder_until_generated(self):
+        """ Пока миниатюры нет, показывается заглушка, а готовая
+        миниатюра сразу попадает на страницу. """
+        url = reverse(self.P_POST_DETAIL, kwargs={'post_id': self.post.pk})
+        with mock.patch('posts.thumbnails.transaction.on_commit') as queued:
+            response = self.client.get(url)
+            self.client.get(url)
+        self.assertEqual(queued.call_count, 1)
+        self.assertContains(response, 'bg-light')
+        self.assertNotContains(response, 'cache/')
+        thumbnails.generate(self.post.pk)
+        response = self.client.get(url)
+        self.assertNotContains(response, 'bg-light')
+        self.assertContains(response, 'cache/')
+
+    def test_search_word_forms(self):
+        """ Поиск находит другие формы слов и следит за изменениями. """
+        post = Post.objects.create(
+            author=self.author, text='Красивые горы на закате')
+        Post.objects.create(author=self.author, text='Горы без заката')
+        url = reverse('posts:search')
+        response = self.client.get(url, {'q': 'красивая гора'})
+        self.assertEqual(list(response.context['page_obj']), [post])
+        post.text = 'Только море'
+        post.save()
+        response = self.client.get(url, {'q': 'красивая гора'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+        response = self.client.get(url, {'q': 'моря'})
+        self.assertEqual(list(response.context['page_obj']), [post])
+        post.delete()
+        response = self.client.get(url, {'q': 'моря'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_search_paginator_and_fallback_index(self):
+        """ Выдача листается с запросом в ссылках; без FTS5 ищет
+        таблица терминов. """
+        Post.objects.bulk_create([
+            Post(author=self.author, text=f'Заметка номер {i}')
+            for i in range(NUM_PAGE + TEST_PAGE_2)
+        ])
+        url = reverse('posts:search')
+        for fts5 in (True, False):
+            with self.subTest(fts5=fts5), mock.patch(
+                    'posts.search.fts5_available', return_value=fts5):
+                search.rebuild()
+                response = self.client.get(url, {'q': 'заметки'})
+                self.assertEqual(
+                    response.context['page_obj'].paginator.count,
+                    NUM_PAGE + TEST_PAGE_2)
+                self.assertContains(response, '?q=%D0%B7%D0%B0%D0%BC')
+                response = self.client.get(
+                    url, {'q': 'заметки', 'page': 2})
+                self.assertEqual(
+                    len(response.context['page_obj']), TEST_PAGE_2)
+
+    def test_export_streams_tables(self):
+        """ Выгрузка отдаётся потоком только персоналу, в NDJSON, CSV
+        и gzip. """
+        url = reverse('posts:export', kwargs={'table': 'posts'})
+        response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), Post.objects.count())
+        self.assertEqual(json.loads(lines[0])['text'], self.post.text)
+        response = self.client.get(
+            reverse('posts:export', kwargs={'table': 'follows'}),
+            {'format': 'csv', 'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        content = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(
+            content.decode().splitlines()[0], 'id,user_id,author_id')
+        response = self.client.get(
+            reverse('posts:export', kwargs={'table': 'users'}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_export_command(self):
+        """ Команда export_data пишет выгрузку в файл. """
+        path = os.path.join(TEMP_MEDIA_ROOT, 'comments.csv')
+        call_command('export_data', 'comments', '--format', 'csv',
+                     '--output', path, '--chunk-size', '1', stderr=StringIO())
+        with open(path, newline='') as export_file:
+            rows = list(csv.DictReader(export_file))
+        self.assertEqual(rows[0]['text'], self.comment.text)
+        self.assertEqual(len(rows), Comment.objects.count())
+
+    def test_export_command_stdout(self):
+        """ Без --output выгрузка идёт в stdout команды. """
+        stdout = StringIO()
+        call_command('export_data', 'posts', stdout=stdout)
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(len(lines), Post.objects.count())
+        self.assertEqual(json.loads(lines[0])['text'], self.post.text)
+        with self.assertRaises(CommandError):
+            call_command('export_data', 'posts', '--gzip', stdout=stdout)
 
     def test_authorized_user_follow(self):
         """ Может ли авторизованный пользователь подписываться. """
@@ -298,10 +590,11 @@ class TestPostViews(TestCase):
                     kwargs={'username': self.author.username}))
         response = self.follower.get(reverse(self.P_FOLLOW_INDEX))
         count_obj_bef = len(response.context['page_obj'].object_list)
-        post_create = Post.objects.create(
-            author=self.author,
-            text=('Тестовый пост!'),
-        )
+        with capture_on_commit_callbacks(execute=True):
+            post_create = Post.objects.create(
+                author=self.author,
+                text=('Тестовый пост!'),
+            )
         response_2 = self.follower.get(reverse(self.P_FOLLOW_INDEX))
         count_obj_awt = len(response_2.context['page_obj'].object_list)
         self.assertEqual(count_obj_bef + 1, count_obj_awt)
@@ -312,6 +605,27 @@ class TestPostViews(TestCase):
         self.assertEqual(post_create.author.username, post.author.username)
         self.assertEqual(post_create.image, post.image)
 
+    def test_follow_feed_timeline(self):
+        """ Лента подписок читается из TimelineEntry, а посты популярных
+        авторов подмешиваются при чтении. """
+        self.follower.get(
+            reverse(self.P_PROFILE_FOLLOW,
+                    kwargs={'username': self.author.username}))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower_us, post=self.post).exists())
+        with mock.patch('posts.timeline.FANOUT_LIMIT', 0):
+            post = Post.objects.create(author=self.author, text='Популярный')
+            self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+            response = self.follower.get(reverse(self.P_FOLLOW_INDEX))
+        self.assertEqual(
+            [obj.id for obj in response.context['page_obj']],
+            [post.id, self.post.id])
+        self.follower.get(
+            reverse(self.P_PROFILE_UNFOLLOW,
+                    kwargs={'username': self.author.username}))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.follower_us).exists())
+
     def test_work_prifile_not_follower(self):
         """ Тестируем не попадает ли пост в ленту не подписавшихся. """
         response = self.authorized_client.get(reverse(self.P_FOLLOW_INDEX))
@@ -357,3 +671,31 @@ class TestPostViews(TestCase):
         )
         count_comment_after = Comment.objects.filter(post=post).count()
         self.assertEqual(count_comment_bef, count_comment_after)
+
+    def test_cursor_paginator(self):
+        """Переход по курсорам выдаёт все посты по порядку без повторов."""
+        cache.clear()
+        Post.objects.bulk_create([
+            Post(author=self.author, text=f'Тестовый пост {i}')
+            for i in range(NUM_PAGE + TEST_PAGE_2 - 1)
+        ])
+        expected = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True))
+        url = reverse(self.P_PROFILE,
+                      kwargs={'username': self.author.username})
+        page_obj = self.client.get(url).context['page_obj']
+        seen = [post.id for post in page_obj]
+        response = self.client.get(url + f'?cursor={page_obj.next_cursor}')
+        page_obj = response.context['page_obj']
+        seen += [post.id for post in page_obj]
+        self.assertEqual(seen, expected)
+        self.assertEqual(page_obj.number, 2)
+        self.assertFalse(page_obj.has_next())
+        response = self.client.get(
+            url + f'?cursor={page_obj.previous_cursor}')
+        page_obj = response.context['page_obj']
+        self.assertEqual([post.id for post in page_obj], expected[:NUM_PAGE])
+        self.assertFalse(page_obj.has_previous())
+        response = self.client.get(url + '?cursor=broken')
+        self.assertEqual(response.context['page_obj'].number, 1)
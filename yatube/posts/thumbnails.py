@@ -0,0 +1,100 @@
+"""Миниатюры картинок постов, которые готовятся в фоне.
+
+Шаблоны берут адрес миниатюры из кэша тегом ``{% cached_thumbnail %}``.
+Пока миниатюры нет, показывается заглушка, а генерация ставится в пул
+потоков; готовая миниатюра сбрасывает карточку и страницы поста.
+С THUMBNAILS_SYNC (тесты) миниатюры готовятся сразу после фиксации.
+"""
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from sorl.thumbnail import get_thumbnail
+
+from . import caching, metrics
+from .constants import (THUMBNAIL_PENDING_TIMEOUT, THUMBNAIL_SIZES,
+                        THUMBNAIL_TIMEOUT, THUMBNAIL_WORKERS)
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails')
+
+    return _executor
+
+
+def thumbnail_key(name, geometry):
+    """Ключ кэша с адресом миниатюры картинки name."""
+    digest = hashlib.md5(name.encode()).hexdigest()
+
+    return f'thumbnail:{geometry}:{digest}'
+
+
+def get(image, geometry):
+    """Готовая миниатюра {'url', 'width', 'height'} или None."""
+    return cache.get(thumbnail_key(image.name, geometry))
+
+
+def generate(post_id):
+    """Готовит все миниатюры картинки поста и сбрасывает его кэш."""
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=post_id).first()
+    if post is None or not post.image:
+        return
+    start = time.perf_counter()
+    for geometry, options in THUMBNAIL_SIZES.items():
+        thumbnail = get_thumbnail(post.image, geometry, **options)
+        cache.set(thumbnail_key(post.image.name, geometry), {
+            'url': thumbnail.url,
+            'width': thumbnail.width,
+            'height': thumbnail.height,
+        }, THUMBNAIL_TIMEOUT)
+    metrics.THUMBNAIL_SECONDS.observe(time.perf_counter() - start)
+    caching.bump_generation(*caching.post_scopes(post))
+
+
+def _generate(post_id):
+    try:
+        generate(post_id)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюры поста %s', post_id)
+
+
+def _work(post_id):
+    try:
+        _generate(post_id)
+    finally:
+        connections.close_all()
+
+
+def _submit(post_id):
+    if getattr(settings, 'THUMBNAILS_SYNC', False):
+        _generate(post_id)
+        return
+    _get_executor().submit(_work, post_id)
+
+
+def schedule(post):
+    """Ставит миниатюры поста в очередь после фиксации транзакции.
+
+    Повторные вызовы, пока задача в очереди, ничего не делают.
+    """
+    pending_key = thumbnail_key(post.image.name, 'pending')
+    if not cache.add(pending_key, True, THUMBNAIL_PENDING_TIMEOUT):
+        return
+    transaction.on_commit(lambda: _submit(post.pk))
@@ -0,0 +1,177 @@
+"""Ленты подписок, собранные заранее (fan-out on write).
+
+Новый пост автора сразу раскладывается в TimelineEntry его подписчиков,
+поэтому лента подписок читается одним запросом по индексу (user, post).
+Посты авторов, у которых подписчиков больше FANOUT_LIMIT, по лентам
+не раскладываются и добавляются к ленте при чтении.
+"""
+from django.db import connection
+from django.db.models import Q
+
+from .constants import FANOUT_LIMIT, TIMELINE_BACKFILL
+from .models import Follow, Post, TimelineEntry, User, UserStats
+
+
+def followers_count(author):
+    """Число подписчиков автора по счётчику UserStats."""
+    return UserStats.objects.filter(user=author).values_list(
+        'followers_count', flat=True).first() or 0
+
+
+def is_fanned_out(author):
+    """Раскладываются ли посты автора по лентам подписчиков."""
+    return followers_count(author) <= FANOUT_LIMIT
+
+
+def _fill(user_ids, post_ids):
+    """Добавляет в ленты все пары (пользователь, пост) одним
+    INSERT ... SELECT; уже существующие пары пропускаются.
+
+    user_ids и post_ids - запросы values() с одним полем. Строки
+    не проходят через Python, поэтому подписка на автора с тысячей
+    постов или пересборка лент популярного автора - один запрос.
+    """
+    users_sql, users_params = user_ids.query.sql_with_params()
+    posts_sql, posts_params = post_ids.query.sql_with_params()
+    ops = connection.ops
+    sql = (
+        f'{ops.insert_statement(ignore_conflicts=True)} '
+        f'{ops.quote_name(TimelineEntry._meta.db_table)} '
+        f'({ops.quote_name("user_id")}, {ops.quote_name("post_id")}) '
+        f'SELECT * FROM ({users_sql}) users, ({posts_sql}) posts'
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, users_params + posts_params)
+
+
+def _latest_posts(author):
+    return Post.objects.filter(author=author).order_by(
+        '-pub_date', '-id').values('id')[:TIMELINE_BACKFILL]
+
+
+def fan_out_post(post):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    if not is_fanned_out(post.author_id):
+        return
+    _fill(
+        Follow.objects.filter(author=post.author_id).values('user_id'),
+        Post.objects.filter(pk=post.pk).values('id'),
+    )
+
+
+def fan_out_posts(posts):
+    """Раскладывает пачку новых постов разных авторов по лентам."""
+    author_ids = {post.author_id for post in posts}
+    popular_ids = set(UserStats.objects.filter(
+        user_id__in=author_ids, followers_count__gt=FANOUT_LIMIT,
+    ).values_list('user_id', flat=True))
+    followers = {}
+    for author_id, user_id in Follow.objects.filter(
+            author_id__in=author_ids - popular_ids).values_list(
+                'author_id', 'user_id'):
+        followers.setdefault(author_id, []).append(user_id)
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=post.pk)
+         for post in posts for user_id in followers.get(post.author_id, ())],
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author):
+    """Добавляет в ленту пользователя последние посты автора."""
+    if not is_fanned_out(author):
+        return
+    _fill(User.objects.filter(pk=user_id).values('id'), _latest_posts(author))
+
+
+def backfill_many(pairs):
+    """Добавляет в ленты последние посты авторов для новых подписок
+    pairs [(user_id, author_id)].
+
+    Все посты авторов, у которых их не больше TIMELINE_BACKFILL
+    (почти все), попадают в ленту пользователя одним запросом; у
+    плодовитых авторов последние посты берутся по одному автору.
+    """
+    stats = {
+        author_id: (followers, posts)
+        for author_id, followers, posts in UserStats.objects.filter(
+            user_id__in={author_id for _, author_id in pairs},
+        ).values_list('user_id', 'followers_count', 'posts_count')
+    }
+    authors_of, users_of = {}, {}
+    for user_id, author_id in pairs:
+        followers, posts = stats.get(author_id, (0, 0))
+        if followers > FANOUT_LIMIT:
+            continue
+        if posts > TIMELINE_BACKFILL:
+            users_of.setdefault(author_id, set()).add(user_id)
+        else:
+            authors_of.setdefault(user_id, set()).add(author_id)
+    for user_id, authors in authors_of.items():
+        _fill(User.objects.filter(pk=user_id).values('id'),
+              Post.objects.filter(author_id__in=authors).values('id'))
+    for author_id, user_ids in users_of.items():
+        _fill(User.objects.filter(pk__in=user_ids).values('id'),
+              _latest_posts(author_id))
+
+
+def drop_many(pairs):
+    """Убирает из лент посты авторов отменённых подписок pairs."""
+    authors_of = {}
+    for user_id, author_id in pairs:
+        authors_of.setdefault(user_id, set()).add(author_id)
+    for user_id, author_ids in authors_of.items():
+        TimelineEntry.objects.filter(
+            user_id=user_id, post__author_id__in=author_ids).delete()
+
+
+def drop(user, author):
+    """Убирает посты автора из ленты пользователя."""
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+
+
+def rebuild_author(author):
+    """Заново раскладывает посты автора по лентам всех подписчиков."""
+    if not is_fanned_out(author):
+        return
+    _fill(
+        Follow.objects.filter(author=author).values('user_id'),
+        _latest_posts(author),
+    )
+
+
+def following(user):
+    """Авторы, на которых подписан пользователь:
+    [(id, username, число подписчиков)]."""
+    return list(Follow.objects.filter(user=user).order_by(
+        'author_id').values_list(
+            'author_id', 'author__username', 'author__stats__followers_count'))
+
+
+def feed(user, authors=None):
+    """Посты ленты подписок пользователя.
+
+    authors - результат following(user), если он уже получен.
+    """
+    if authors is None:
+        authors = following(user)
+    posts = Post.objects.select_related('author', 'group')
+    entries = TimelineEntry.objects.filter(user=user).values('post_id')
+    popular_ids = [
+        author_id for author_id, _, followers in authors
+        if (followers or 0) > FANOUT_LIMIT
+    ]
+    if not popular_ids:
+        return posts.filter(id__in=entries)
+
+    return posts.filter(Q(id__in=entries) | Q(author_id__in=popular_ids))
+
+
+def feed_scopes(authors):
+    """Области поколений, от которых зависит состав ленты подписок.
+
+    Посты авторов и сами подписки сбрасывают их профили, а смена
+    списка подписок меняет и набор областей.
+    """
+    return [f'profile_page:{username}' for _, username, _ in authors]
@@ -27,5 +27,7 @@ urlpatterns = [
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('follow/', views.follow_index, name='follow_index'),
     path('create/', views.post_create, name='post_create'),
+    path('search/', views.search_posts, name='search'),
+    path('export/<str:table>/', views.export_table, name='export'),
     path('', views.index, name='home'),
 ]
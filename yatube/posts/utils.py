@@ -1,11 +1,271 @@
-from django.core.paginator import Paginator
+import hashlib
 
-from .constants import NUM_PAGE
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_text
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 
+from .caching import get_generations
+from .constants import (COUNT_CACHE_TIMEOUT, ESTIMATE_MIN_ROWS, NUM_PAGE,
+                        PAGE_ENDS, PAGE_WINDOW)
 
-def help_paginator(request, posts, num=NUM_PAGE):
-    """Paginator func."""
-    paginator = Paginator(posts, num)
+"""Направления курсора: страница после ключа и страница перед ключом."""
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+def estimated_count(model):
+    """Оценка числа строк таблицы по статистике планировщика или None.
+
+    PostgreSQL хранит её в pg_class.reltuples, SQLite - в sqlite_stat1,
+    которая появляется после ANALYZE.
+    """
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples FROM pg_class WHERE relname = %s'
+    elif connection.vendor == 'sqlite':
+        sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1'
+    else:
+        return None
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(sql, [table])
+        except DatabaseError:
+            # В SQLite до первого ANALYZE таблицы статистики нет.
+            return None
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    # В sqlite_stat1 первое число - строк в таблице, дальше - по индексу.
+    estimate = int(float(str(row[0]).split()[0]))
+
+    return estimate if estimate >= 0 else None
+
+
+def cached_count(count, scopes, estimate_model=None):
+    """Число объектов из кэша, пока не сменились поколения scopes.
+
+    При промахе вызывает count(); если передана estimate_model и в её
+    таблице не меньше ESTIMATE_MIN_ROWS строк, берёт оценку планировщика.
+    """
+    generation = '.'.join(map(str, get_generations(*scopes)))
+    key = 'count:' + hashlib.md5(
+        f'{"|".join(scopes)}:{generation}'.encode()).hexdigest()
+    result = cache.get(key)
+    if result is None:
+        if estimate_model is not None:
+            result = estimated_count(estimate_model)
+        if result is None or result < ESTIMATE_MIN_ROWS:
+            result = count()
+        cache.set(key, result, COUNT_CACHE_TIMEOUT)
+
+    return result
+
+
+class CachedCountPaginator(Paginator):
+    """Паджинатор без COUNT(*) на каждый запрос.
+
+    Число объектов берётся из approximate_count, если оно передано,
+    из кэша по областям count_scopes или считается как обычно.
+    estimate разрешает оценку планировщика - только для выборки
+    из всей таблицы. Номера страниц показываются окном вокруг текущей.
+    """
+
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, approximate_count=None,
+                 count_scopes=(), estimate=False, **kwargs):
+        self.approximate_count = approximate_count
+        self.count_scopes = count_scopes
+        self.estimate = estimate
+        super().__init__(object_list, per_page, **kwargs)
+
+    @cached_property
+    def count(self):
+        if self.approximate_count is not None:
+            return self.approximate_count
+        if not self.count_scopes:
+            return super().count
+        exact_count = Paginator.count.func
+        model = getattr(self.object_list, 'model', None)
+
+        return cached_count(
+            lambda: exact_count(self), self.count_scopes,
+            model if self.estimate else None)
+
+    def page_window(self, number):
+        """Номера страниц не дальше PAGE_WINDOW от number."""
+        return range(max(number - PAGE_WINDOW, 1),
+                     min(number + PAGE_WINDOW, self.num_pages) + 1)
+
+    def elided_page_range(self, number):
+        """Первые и последние PAGE_ENDS номеров и окно вокруг number;
+        пропуски заменены на ELLIPSIS.
+
+        Длина не зависит от числа страниц, поэтому и HTML паджинатора.
+        """
+        window = self.page_window(number)
+        if window.start > PAGE_ENDS + 1:
+            yield from range(1, PAGE_ENDS + 1)
+            if window.start > PAGE_ENDS + 2:
+                yield self.ELLIPSIS
+            else:
+                yield PAGE_ENDS + 1
+        else:
+            yield from range(1, window.start)
+        yield from window
+        last_start = self.num_pages - PAGE_ENDS + 1
+        if window.stop < last_start:
+            if window.stop < last_start - 1:
+                yield self.ELLIPSIS
+            else:
+                yield window.stop
+            yield from range(last_start, self.num_pages + 1)
+        else:
+            yield from range(window.stop, self.num_pages + 1)
+
+    def _get_page(self, *args, **kwargs):
+        page = super()._get_page(*args, **kwargs)
+        page.elided_range = list(self.elided_page_range(page.number))
+
+        return page
+
+
+class KeysetPage(Page):
+    """Страница, выбранная по курсору: без COUNT(*) и OFFSET."""
+
+    keyset = True
+
+    def __init__(self, object_list, number, paginator,
+                 has_next, has_previous):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.paginator.per_page + 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
+
+
+class KeysetPaginator(CachedCountPaginator):
+    """Паджинатор с выборкой страниц по ключу (key_field, id).
+
+    Номерные страницы (``?page=``) работают как в обычном Paginator,
+    а переход по курсору (``?cursor=``) выполняется одним индексным
+    запросом без COUNT(*) и OFFSET, сколько бы страниц ни было до него.
+    """
+
+    def __init__(self, object_list, per_page, key_field='pub_date',
+                 **kwargs):
+        self.key_field = key_field
+        super().__init__(
+            object_list.order_by(f'-{key_field}', '-id'), per_page, **kwargs)
+
+    def encode_cursor(self, obj, direction, number):
+        """Непрозрачный токен курсора для объекта obj."""
+        raw = '|'.join((
+            direction,
+            str(number),
+            getattr(obj, self.key_field).isoformat(),
+            str(obj.pk),
+        ))
+        return urlsafe_base64_encode(force_bytes(raw))
+
+    def decode_cursor(self, cursor):
+        """Разбирает токен курсора; для битого токена возвращает None."""
+        try:
+            direction, number, key, pk = force_text(
+                urlsafe_base64_decode(cursor)).split('|')
+            key = parse_datetime(key)
+            number, pk = int(number), int(pk)
+        except ValueError:
+            return None
+        if direction not in (FORWARD, BACKWARD) or key is None:
+            return None
+        return direction, max(number, 1), key, pk
+
+    def cursor_page(self, cursor):
+        """Страница по курсору; битый курсор ведёт на первую страницу."""
+        decoded = self.decode_cursor(cursor)
+        if decoded is None:
+            return self.page(1)
+        direction, number, key, pk = decoded
+        field = self.key_field
+        if direction == FORWARD:
+            after = (Q(**{f'{field}__lt': key})
+                     | Q(**{field: key, 'pk__lt': pk}))
+            rows = list(self.object_list.filter(after)[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            has_previous = True
+            rows = rows[:self.per_page]
+        else:
+            before = (Q(**{f'{field}__gt': key})
+                      | Q(**{field: key, 'pk__gt': pk}))
+            rows = list(
+                self.object_list.filter(before).reverse()[:self.per_page + 1])
+            has_next = True
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+        if not has_previous:
+            number = 1
+        page = KeysetPage(rows, number, self, has_next, has_previous)
+
+        return self._attach_cursors(page)
+
+    def _get_page(self, *args, **kwargs):
+        return self._attach_cursors(super()._get_page(*args, **kwargs))
+
+    def _attach_cursors(self, page):
+        """Добавляет странице курсоры соседних страниц."""
+        page.next_cursor = page.previous_cursor = None
+        if not len(page):
+            return page
+        if page.has_next():
+            page.next_cursor = self.encode_cursor(
+                page[-1], FORWARD, page.number + 1)
+        if page.has_previous():
+            page.previous_cursor = self.encode_cursor(
+                page[0], BACKWARD, page.number - 1)
+
+        return page
+
+
+def help_paginator(request, posts, num=NUM_PAGE, count=None,
+                   key_field='pub_date', count_scopes=(), estimate=False):
+    """Paginator func.
+
+    С параметром ``?cursor=`` страница выбирается по ключу key_field,
+    иначе по номеру из ``?page=``. count - необязательное приблизительное
+    число объектов, избавляющее от COUNT(*); count_scopes - области
+    поколений, по которым число объектов кэшируется, estimate -
+    разрешение брать оценку планировщика для всей таблицы.
+    """
+    paginator = KeysetPaginator(
+        posts, num, key_field=key_field, approximate_count=count,
+        count_scopes=count_scopes, estimate=estimate)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.cursor_page(cursor)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
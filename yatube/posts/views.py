@@ -1,11 +1,21 @@
+from urllib.parse import urlencode
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
+from django.db import transaction
+from django.db.models import Max
+
+from core.replicas import read_from_replica
 
 from .models import Post, Group, User, Follow
 from .forms import PostForm, CommentForm
-from .utils import help_paginator
+from . import export, search, timeline
+from .caching import cache_page_by_generation, condition_by_generation
+from .constants import COMMENTS_NUM, SEARCH_NUM
+from .utils import CachedCountPaginator, help_paginator
 
 
 def _get_post_objects():
@@ -15,50 +25,118 @@ def _get_post_objects():
     return result
 
 
-@cache_page(20)
+@read_from_replica
+@condition_by_generation('index')
+@cache_page_by_generation('index')
 def index(request):
     """Вывод главной страницы с постами."""
     posts = _get_post_objects()
     context = {
-        'page_obj': help_paginator(request, posts),
+        'page_obj': help_paginator(
+            request, posts, count_scopes=('index',), estimate=True),
     }
 
     return render(request, "posts/index.html", context)
 
 
+@read_from_replica
+@condition_by_generation('group_page:{slug}')
+@cache_page_by_generation('group_page:{slug}')
 def group_posts(request, slug):
     """Вывод страницы с постами конкретной группы."""
     group = Group.objects.get(slug=slug)
-    posts = group.posts.all()
+    posts = _get_post_objects().filter(group=group)
 
     context_group = {
         'group': group,
-        'page_obj': help_paginator(request, posts),
+        'page_obj': help_paginator(
+            request, posts, count_scopes=(f'group_page:{slug}',)),
     }
 
     return render(request, "posts/group_list.html", context_group)
 
 
+@read_from_replica
+@condition_by_generation('profile_page:{username}', 'groups')
+@cache_page_by_generation('profile_page:{username}', 'groups')
 def profile(request, username):
     """Вывод страницы с постами конкретного пользователя."""
-    user = get_object_or_404(User, username=username)
-    posts = user.posts.all()
+    user = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    posts = _get_post_objects().filter(author=user)
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user, author=user).exists()
 
     context_profile = {
         'author': user,
-        'page_obj': help_paginator(request, posts),
+        'page_obj': help_paginator(
+            request, posts, count_scopes=(f'profile_page:{username}',)),
         'following': following,
     }
 
     return render(request, "posts/profile.html", context_profile)
 
 
+def search_posts(request):
+    """Поиск постов по словам запроса, лучшие совпадения первыми."""
+    query = request.GET.get('q', '').strip()
+    paginator = CachedCountPaginator(search.search(query), SEARCH_NUM)
+
+    context = {
+        'query': query,
+        'page_obj': paginator.get_page(request.GET.get('page')),
+        'page_query': urlencode({'q': query}) + '&',
+    }
+
+    return render(request, 'posts/search.html', context)
+
+
+@staff_member_required
+def export_table(request, table):
+    """Потоковая выгрузка таблицы для аналитики: ?format=csv&gzip=1."""
+    fmt = request.GET.get('format', 'ndjson')
+    if table not in export.EXPORTS or fmt not in export.FORMATS:
+        raise Http404
+    gzip = request.GET.get('gzip') == '1'
+    response = StreamingHttpResponse(
+        export.stream(table, fmt, gzip),
+        content_type='application/gzip' if gzip else export.FORMATS[fmt],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{export.filename(table, fmt, gzip)}"')
+
+    return response
+
+
+def _post_versions(post_id):
+    """Области страницы поста и время его публикации или последнего
+    комментария."""
+    row = Post.objects.filter(pk=post_id).values(
+        'group_id', 'author__username', 'pub_date').annotate(
+            last_comment=Max('comments__created')).order_by().first()
+    if row is None:
+        return None
+    scopes = [
+        f'post:{post_id}',
+        f'group:{row["group_id"]}',
+        f'profile_page:{row["author__username"]}',
+    ]
+
+    return scopes, max(filter(None, (row['pub_date'], row['last_comment'])))
+
+
+@read_from_replica
+@condition_by_generation(resolve=_post_versions)
 def post_detail(request, post_id):
     """Вывод информации о конкретном посте."""
-    post_valid = get_object_or_404(Post, id=post_id)
-    comments = post_valid.comments.all()
+    post_valid = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id)
+    comments = help_paginator(
+        request,
+        post_valid.comments.select_related('author'),
+        COMMENTS_NUM,
+        key_field='created',
+    )
     form = CommentForm()
     context_detail = {
         'post_valid': post_valid,
@@ -70,6 +148,7 @@ def post_detail(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def post_create(request):
     """Страница создания поста."""
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -114,6 +193,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     """View функция для отображения комментариев к постам."""
     post = get_object_or_404(Post, id=post_id)
@@ -128,19 +208,22 @@ def add_comment(request, post_id):
 
 
 @login_required
+@read_from_replica
 def follow_index(request):
     """ Страница с постами интересных пользователей. """
-    posts = Post.objects.select_related(
-        'author', 'group').filter(author__following__user=request.user)
+    authors = timeline.following(request.user)
+    posts = timeline.feed(request.user, authors)
 
     context = {
-        'page_obj': help_paginator(request, posts),
+        'page_obj': help_paginator(
+            request, posts, count_scopes=timeline.feed_scopes(authors)),
     }
 
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     """ Подписаться на автора. """
     author = get_object_or_404(User, username=username)
@@ -157,6 +240,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     """ Отписаться от автора. """
     author = get_object_or_404(User, username=username)
@@ -0,0 +1,97 @@
+"""Настройки баз данных из переменных окружения.
+
+YATUBE_DB_ENGINE, YATUBE_DB_NAME, YATUBE_DB_USER, YATUBE_DB_PASSWORD,
+YATUBE_DB_HOST, YATUBE_DB_PORT - подключение к основной базе
+(по умолчанию SQLite-файл db.sqlite3 рядом с проектом).
+
+YATUBE_DB_CONN_MAX_AGE - сколько секунд держать соединение между
+запросами (0 - закрывать после каждого); YATUBE_DB_HEALTH_CHECKS=0
+отключает проверку живости такого соединения в начале запроса.
+
+Для SQLite при открытии соединения выполняются PRAGMAS: журнал WAL
+(читатели не ждут писателя), synchronous=NORMAL, mmap и ожидание
+блокировки вместо немедленной ошибки, а транзакции atomic
+начинаются с BEGIN IMMEDIATE. Размеры задают YATUBE_SQLITE_MMAP_SIZE
+(байт) и YATUBE_SQLITE_BUSY_TIMEOUT (мс), режим транзакций -
+YATUBE_SQLITE_TRANSACTION_MODE; YATUBE_SQLITE_TUNING=0 оставляет
+настройки SQLite по умолчанию.
+
+YATUBE_DB_REPLICAS - реплики только для чтения через запятую:
+файлы SQLite или хосты остальных СУБД. Реплика SQLite открывается
+без PRAGMA, которые пишут в файл базы (WRITE_PRAGMAS), без BEGIN
+IMMEDIATE и с query_only: записи в неё отклоняются.
+"""
+import os
+
+SQLITE = 'django.db.backends.sqlite3'
+
+# PRAGMA, которые меняют файл базы: на репликах не выполняются.
+WRITE_PRAGMAS = ('journal_mode', 'synchronous')
+
+
+def _flag(env, name, default):
+    return env.get(name, '1' if default else '0') not in ('0', 'false', '')
+
+
+def sqlite_pragmas(env):
+    """PRAGMA, которые выполняются на каждом новом соединении SQLite."""
+    if not _flag(env, 'YATUBE_SQLITE_TUNING', True):
+        return {}
+
+    return {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'mmap_size': int(env.get('YATUBE_SQLITE_MMAP_SIZE', 256 * 2 ** 20)),
+        'busy_timeout': int(env.get('YATUBE_SQLITE_BUSY_TIMEOUT', 5000)),
+    }
+
+
+def database(env, base_dir):
+    """Настройки основной базы."""
+    engine = env.get('YATUBE_DB_ENGINE', SQLITE)
+    config = {
+        'ENGINE': engine,
+        'NAME': env.get(
+            'YATUBE_DB_NAME', os.path.join(base_dir, 'db.sqlite3')),
+        'CONN_MAX_AGE': int(env.get('YATUBE_DB_CONN_MAX_AGE', 60)),
+        'HEALTH_CHECKS': _flag(env, 'YATUBE_DB_HEALTH_CHECKS', True),
+    }
+    if engine == SQLITE:
+        config['PRAGMAS'] = sqlite_pragmas(env)
+        if config['PRAGMAS']:
+            config['TRANSACTION_MODE'] = env.get(
+                'YATUBE_SQLITE_TRANSACTION_MODE', 'IMMEDIATE')
+    else:
+        for key in ('USER', 'PASSWORD', 'HOST', 'PORT'):
+            config[key] = env.get(f'YATUBE_DB_{key}', '')
+
+    return config
+
+
+def replica(default, location):
+    """Настройки реплики по настройкам основной базы default."""
+    if default['ENGINE'] != SQLITE:
+        return dict(default, HOST=location, TEST={'MIRROR': 'default'})
+    config = dict(default, NAME=location, TEST={'MIRROR': 'default'})
+    config.pop('TRANSACTION_MODE', None)
+    config['PRAGMAS'] = {
+        name: value for name, value in default.get('PRAGMAS', {}).items()
+        if name not in WRITE_PRAGMAS
+    }
+    config['PRAGMAS']['query_only'] = 'on'
+
+    return config
+
+
+def databases(env, base_dir):
+    """DATABASES и список псевдонимов реплик для DATABASE_REPLICAS."""
+    default = database(env, base_dir)
+    result = {'default': default}
+    replicas = []
+    for number, location in enumerate(filter(None, env.get(
+            'YATUBE_DB_REPLICAS', '').split(',')), start=1):
+        alias = f'replica_{number}'
+        result[alias] = replica(default, location)
+        replicas.append(alias)
+
+    return result, replicas
@@ -1,5 +1,7 @@
 import os
 
+from .db_config import databases
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -38,7 +40,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.replicas.ReplicaStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -73,12 +78,14 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
-}
+# Подключение, постоянные соединения и PRAGMA SQLite задаются
+# переменными окружения YATUBE_DB_*, см. yatube/db_config.py.
+# Из реплик (YATUBE_DB_REPLICAS) читают списки и страницы постов,
+# пользователь после записи ещё REPLICA_STICKY_SECONDS секунд читает
+# из основной базы.
+DATABASES, DATABASE_REPLICAS = databases(os.environ, BASE_DIR)
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+REPLICA_STICKY_SECONDS = 10
 
 
 # Password validation
@@ -131,10 +138,48 @@ LOGIN_REDIRECT_URL = 'posts:home'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+TEST_RUNNER = 'core.testing.TestRunner'
 
+# Двухуровневый кэш: LRU в памяти процесса перед общим для воркеров
+# файловым кэшем (см. core/cache.py). В L1 попадают только ключи,
+# содержимое которых под одним ключом не меняется: карточки с
+# поколениями в ключе и адреса миниатюр. Страницы и числа объектов
+# перезаписываются под тем же ключом и читаются только из L2.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TieredCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'L1_MAX_BYTES': 32 * 2 ** 20,
+            'L1_TIMEOUT': 60,
+            'L1_PREFIXES': ('post_card:', 'thumbnail:'),
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.FileCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_DIR', os.path.join(BASE_DIR, 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
 }
+# Страницы и карточки пересчитывает один запрос, остальные ждут его
+# или получают устаревшее значение (posts/caching.py: fetch).
+CACHE_STAMPEDE_PROTECTION = True
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
+# Профилирование запросов: доля замеряемых запросов (0 - выключено)
+# и период записи сводки в лог, секунд. Сводка - на странице /profiling/.
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_LOG_INTERVAL = 60
+
+# Адреса, с которых /metrics доступен без входа, через запятую в
+# YATUBE_METRICS_ALLOWED_IPS; по умолчанию - только сотрудникам. Адрес
+# берётся из REMOTE_ADDR, поэтому список работает, только когда
+# gunicorn слушает внешний адрес сам: за nginx на том же хосте
+# REMOTE_ADDR у всех запросов 127.0.0.1.
+METRICS_ALLOWED_IPS = tuple(filter(None, os.environ.get(
+    'YATUBE_METRICS_ALLOWED_IPS', '').split(',')))
+
+# Готовить миниатюры сразу, а не в пуле потоков (включается в тестах,
+# см. core/testing.py).
+THUMBNAILS_SYNC = False
@@ -3,12 +3,17 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import metrics_view, profiling_report
+
 
 urlpatterns = [
     path('about/', include('about.urls', namespace='about')),
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('admin/', admin.site.urls),
+    path('api/v1/', include('posts.api_urls', namespace='api_v1')),
+    path('profiling/', profiling_report, name='profiling'),
+    path('metrics', metrics_view, name='metrics'),
     path('', include('posts.urls', namespace='posts')),
 ]
 